@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a unique, indexed ordering so every page is one
+    indexed range query regardless of how deep the client has paged.
+
+    Clients may shrink or grow the page with ?page_size= up to
+    settings.API_MAX_PAGE_SIZE.
+    """
+
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = "id"
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = ordering
+
+    def get_paginated_response(self, key, data):
+        """
+        Returns: {key: [...], "next": url | None, "previous": url | None}
+        """
+        return Response(
+            {
+                key: data,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+            }
+        )
@@ -1,3 +1,627 @@
-from django.test import TestCase
+from core.attainment import rebuild_attainment
+from core.models import (
+    Assesment,
+    AssessmentLearningOutcome,
+    Course,
+    LearningOutcome,
+    ProgramLearningOutcome,
+    ProgramOutcome,
+    StudentAssessmentScore,
+    User,
+)
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.urls import reverse
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+
+class CourseListQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create_user(
+            username="head", email="head@example.com", password="x", role="head"
+        )
+        teacher = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="x",
+            role="teacher",
+        )
+        for i in range(20):
+            course = Course.objects.create(
+                code=f"CS{i:03}",
+                name=f"Course {i}",
+                created_by=teacher if i % 2 else None,
+            )
+            for j in range(3):
+                LearningOutcome.objects.create(
+                    code=f"LO{i:03}{j}", description="", course=course
+                )
+            for name in ("midterm", "final"):
+                Assesment.objects.create(name=name, course=course)
+
+    def setUp(self):
+        self.client.force_authenticate(self.head)
+
+    def test_course_list_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("courses"))
+
+        courses = response.json()["courses"]
+        self.assertEqual(len(courses), 20)
+        self.assertEqual(courses[0]["created_by"], {"username": "Unknown"})
+        self.assertEqual(courses[1]["created_by"], {"username": "teacher"})
+        for course in courses:
+            self.assertEqual(course["learning_outcome_count"], 3)
+            self.assertEqual(course["assessment_count"], 2)
+
+    def test_empty_course_counts_are_zero(self):
+        Course.objects.create(code="EMPTY", name="Empty")
+
+        response = self.client.get(reverse("courses"), {"code": "EMPTY"})
+
+        [course] = response.json()["courses"]
+        self.assertEqual(course["learning_outcome_count"], 0)
+        self.assertEqual(course["assessment_count"], 0)
+
+
+class CourseDetailQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create_user(
+            username="head", email="head@example.com", password="x", role="head"
+        )
+        program_outcomes = [
+            ProgramOutcome.objects.create(code=f"PO{i}", description="")
+            for i in range(4)
+        ]
+        cls.course = Course.objects.create(
+            code="CS101", name="Course", created_by=cls.head
+        )
+        cls.add_outcomes(cls.course, program_outcomes, count=2)
+
+    @classmethod
+    def add_outcomes(cls, course, program_outcomes, count):
+        for i in range(count):
+            outcome = LearningOutcome.objects.create(
+                code=f"{course.code}-LO{i}", description="", course=course
+            )
+            for program_outcome in program_outcomes:
+                ProgramLearningOutcome.objects.create(
+                    program_outcome=program_outcome, learning_outcome=outcome
+                )
+            for name in ("midterm", "final"):
+                assessment = Assesment.objects.create(name=name, course=course)
+                AssessmentLearningOutcome.objects.create(
+                    assesment=assessment, learning_outcome=outcome, weight=2
+                )
+
+    def setUp(self):
+        self.client.force_authenticate(self.head)
+
+    def get_detail(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("course_detail", args=[self.course.id]))
+        return response.json()
+
+    def test_course_detail_query_count(self):
+        data = self.get_detail()
+
+        self.assertEqual(data["created_by"]["username"], "head")
+        self.assertEqual(len(data["learning_outcomes"]), 2)
+        self.assertEqual(
+            [
+                po["program_outcome"]
+                for po in data["learning_outcomes"][0]["program_outcomes"]
+            ],
+            ["PO0", "PO1", "PO2", "PO3"],
+        )
+        self.assertEqual(len(data["assessments"]), 4)
+        self.assertEqual(
+            data["assessments"][0]["learning_outcomes"],
+            [{"learning_outcome": "CS101-LO0", "weight": 2}],
+        )
+
+    def test_query_count_does_not_grow_with_the_course(self):
+        LearningOutcome.objects.filter(course=self.course).delete()
+        Assesment.objects.filter(course=self.course).delete()
+        self.add_outcomes(self.course, list(ProgramOutcome.objects.all()), count=10)
+
+        data = self.get_detail()
+
+        self.assertEqual(len(data["learning_outcomes"]), 10)
+        self.assertEqual(len(data["assessments"]), 20)
+
+
+class StudentCoursesQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="x",
+            role="student",
+        )
+        classmates = [
+            User.objects.create_user(
+                username=f"classmate{i}",
+                email=f"classmate{i}@example.com",
+                password="x",
+                role="student",
+            )
+            for i in range(10)
+        ]
+        for i in range(3):
+            course = Course.objects.create(code=f"CS{i}", name=f"Course {i}")
+            course.students.add(cls.student, *classmates)
+            midterm = Assesment.objects.create(name="midterm", course=course)
+            Assesment.objects.create(name="final", course=course)
+            StudentAssessmentScore.objects.create(
+                student=cls.student, assesment=midterm, score=70 + i
+            )
+            for classmate in classmates:
+                StudentAssessmentScore.objects.create(
+                    student=classmate, assesment=midterm, score=10
+                )
+
+    def test_only_own_scores_in_constant_queries(self):
+        self.client.force_authenticate(self.student)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("me_courses"))
+
+        courses = sorted(response.json()["courses"], key=lambda c: c["code"])
+        self.assertEqual(len(courses), 3)
+        for i, course in enumerate(courses):
+            scores = {a["name"]: a["score"] for a in course["assessments"]}
+            self.assertEqual(scores, {"Midterm": 70 + i, "Final": None})
+
+
+class ExistingGradesLayoutTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create_user(
+            username="head", email="head@example.com", password="x", role="head"
+        )
+        cls.course = Course.objects.create(code="CS101", name="Course")
+        midterm = Assesment.objects.create(name="midterm", course=cls.course)
+        cls.final = Assesment.objects.create(name="final", course=cls.course)
+        for username in ("enrolled", "unscored", "dropped"):
+            student = User.objects.create_user(
+                username=username,
+                email=f"{username}@example.com",
+                password="x",
+                role="student",
+            )
+            if username != "dropped":
+                cls.course.students.add(student)
+            if username != "unscored":
+                StudentAssessmentScore.objects.create(
+                    student=student, assesment=midterm, score=50
+                )
+
+    def setUp(self):
+        self.client.force_authenticate(self.head)
+
+    def test_columnar_lists_the_same_scores_as_nested(self):
+        url = reverse("existing_grades", args=[self.course.id])
+        nested = self.client.get(url).json()
+
+        columnar = self.client.get(url, {"layout": "columnar"}).json()
+
+        self.assertEqual(columnar["students"], ["dropped", "enrolled", "unscored"])
+        self.assertEqual(columnar["total_students"], 3)
+        self.assertEqual(columnar["scores"][2], [None, None])
+        ids = [assessment["id"] for assessment in columnar["assessments"]]
+        self.assertEqual(
+            {
+                username: {
+                    str(assesment_id): score
+                    for assesment_id, score in zip(ids, row)
+                    if score is not None
+                }
+                for username, row in zip(columnar["students"], columnar["scores"])
+                if any(score is not None for score in row)
+            },
+            nested,
+        )
+
+    def test_row_range(self):
+        url = reverse("existing_grades", args=[self.course.id])
+
+        response = self.client.get(url, {"layout": "columnar", "offset": 1, "limit": 1})
+
+        self.assertEqual(response.json()["students"], ["enrolled"])
+        self.assertEqual(response.json()["total_students"], 3)
+
+
+class ReportCalculationTests(APITestCase):
+    """
+    Checks report numbers against values worked out by hand:
+
+    CS101: midterm scores 60 and 80 (average 70), final 90, project unscored (0)
+        LO1 = (2 * 70 + 3 * 90) / 5 = 82       -> PO1 weight 3
+        LO2 = (1 * 0 + 1 * 90) / 2 = 45        -> PO1 weight 1, PO2 weight 2
+        LO3 = 70                               (no program outcome links)
+        PO1 = (3 * 82 + 45) / 4 = 291 / 4, PO2 = 2 * 45 / 2
+    CS102: final 50, LO4 = 50                  -> PO1 weight 2
+    Department: PO1 = (291 + 100) / 6, PO2 = 90 / 2; PO3 has no links.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create_user(
+            username="head", email="head@example.com", password="x", role="head"
+        )
+        po1, po2, _ = [
+            ProgramOutcome.objects.create(code=f"PO{i}", description="")
+            for i in (1, 2, 3)
+        ]
+        cls.cs101 = Course.objects.create(code="CS101", name="Course 1")
+        cs102 = Course.objects.create(code="CS102", name="Course 2")
+        students = [
+            User.objects.create_user(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                password="x",
+                role="student",
+            )
+            for i in range(2)
+        ]
+
+        cls.midterm = Assesment.objects.create(name="midterm", course=cls.cs101)
+        cls.final = Assesment.objects.create(name="final", course=cls.cs101)
+        cls.project = Assesment.objects.create(name="project", course=cls.cs101)
+        final2 = Assesment.objects.create(name="final", course=cs102)
+        for assessment, student, score in (
+            (cls.midterm, students[0], 60),
+            (cls.midterm, students[1], 80),
+            (cls.final, students[0], 90),
+            (final2, students[0], 50),
+        ):
+            StudentAssessmentScore.objects.create(
+                student=student, assesment=assessment, score=score
+            )
+
+        cls.outcomes = {
+            code: LearningOutcome.objects.create(
+                code=code, description="", course=course
+            )
+            for code, course in (
+                ("LO1", cls.cs101),
+                ("LO2", cls.cs101),
+                ("LO3", cls.cs101),
+                ("LO4", cs102),
+            )
+        }
+        for assessment, code, weight in (
+            (cls.midterm, "LO1", 2),
+            (cls.final, "LO1", 3),
+            (cls.project, "LO2", 1),
+            (cls.final, "LO2", 1),
+            (cls.midterm, "LO3", 1),
+            (final2, "LO4", 1),
+        ):
+            AssessmentLearningOutcome.objects.create(
+                assesment=assessment,
+                learning_outcome=cls.outcomes[code],
+                weight=weight,
+            )
+        for code, program_outcome, weight in (
+            ("LO1", po1, 3),
+            ("LO2", po1, 1),
+            ("LO2", po2, 2),
+            ("LO4", po1, 2),
+        ):
+            ProgramLearningOutcome.objects.create(
+                learning_outcome=cls.outcomes[code],
+                program_outcome=program_outcome,
+                weight=weight,
+            )
+        rebuild_attainment()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.head)
+
+    def test_course_report(self):
+        response = self.client.get(reverse("course_report", args=[self.cs101.id]))
+
+        data = response.json()
+        self.assertEqual(
+            data["assessments"],
+            {str(self.midterm.id): 70, str(self.final.id): 90, str(self.project.id): 0},
+        )
+        self.assertEqual(
+            data["learning_outcomes"],
+            {
+                str(self.outcomes["LO1"].id): 82,
+                str(self.outcomes["LO2"].id): 45,
+                str(self.outcomes["LO3"].id): 70,
+            },
+        )
+        self.assertEqual(data["program_outcomes"], {"PO1": 72.75, "PO2": 45, "PO3": 0})
+
+    def test_department_report(self):
+        response = self.client.post(reverse("generate_reports"))
+
+        data = response.json()
+        cs101, cs102 = data["reports"]
+        self.assertEqual(
+            cs101["assessments"][str(self.project.id)],
+            {"label": "Project 1", "average": 0},
+        )
+        self.assertEqual(cs101["program_outcome_contribution"], {"PO1": 291, "PO2": 90})
+        self.assertEqual(cs102["program_outcome_contribution"], {"PO1": 100})
+        self.assertEqual(data["program_outcomes"], {"PO1": 65.17, "PO2": 45})
+
+    def test_what_if(self):
+        # Project average 0 -> 50 makes LO2 = (50 + 90) / 2 = 70, and dropping
+        # final -> LO1 makes LO1 = 70. Linking LO4 to PO2 adds 2 * 50.
+        response = self.client.post(
+            reverse("what_if_report"),
+            {
+                "score_shifts": {str(self.project.id): 50},
+                "assessment_weights": [
+                    {
+                        "assessment_id": self.final.id,
+                        "learning_outcome": "LO1",
+                        "weight": 0,
+                    }
+                ],
+                "program_outcome_weights": [
+                    {"learning_outcome": "LO4", "program_outcome": "PO2", "weight": 2}
+                ],
+            },
+            format="json",
+        )
+
+        data = response.json()
+        self.assertEqual(
+            [report["program_outcome_contribution"] for report in data["reports"]],
+            [{"PO1": 280, "PO2": 140}, {"PO1": 100, "PO2": 100}],
+        )
+        self.assertEqual(data["program_outcomes"], {"PO1": 63.33, "PO2": 60})
+        self.assertEqual(data["baseline_program_outcomes"], {"PO1": 65.17, "PO2": 45})
+
+
+class CourseCreateTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create_user(
+            username="head", email="head@example.com", password="x", role="head"
+        )
+        cls.po1 = ProgramOutcome.objects.create(code="PO1", description="")
+
+    def setUp(self):
+        self.client.force_authenticate(self.head)
+
+    def payload(self, lo_code="LO1"):
+        return {
+            "course_code": "CS101",
+            "course_name": "Course 1",
+            "learning_outcomes": [
+                {
+                    "code": lo_code,
+                    "description": "First",
+                    "program_outcomes": [
+                        {"code": "PO1", "weight": 3},
+                        {"code": "PO9", "weight": 1},
+                    ],
+                },
+            ],
+            "assessments": [
+                {
+                    "assessment_type": "midterm",
+                    "learning_outcomes": [
+                        {"code": lo_code, "weight": 2},
+                        {"code": "LO9", "weight": 1},
+                    ],
+                },
+            ],
+        }
+
+    def test_links_to_unknown_codes_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("courses"), self.payload(), format="json"
+            )
+
+        self.assertEqual(response.status_code, 201)
+        course = Course.objects.get(code="CS101")
+        self.assertEqual(course.created_by, self.head)
+        lo = course.learning_outcomes.get()
+        self.assertEqual(
+            list(
+                lo.programlearningoutcome_set.values_list("program_outcome", "weight")
+            ),
+            [(self.po1.id, 3)],
+        )
+        self.assertEqual(
+            list(
+                AssessmentLearningOutcome.objects.values_list(
+                    "assesment__name", "learning_outcome", "weight"
+                )
+            ),
+            [("midterm", lo.id, 2)],
+        )
+        # Bulk inserts skip the signals, so the refresh is scheduled directly.
+        self.assertEqual(lo.attainment.score, 0)
+
+    def test_long_learning_outcome_code_is_rejected(self):
+        response = self.client.post(
+            reverse("courses"), self.payload(lo_code="LO12345678X"), format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                "learning_outcomes": [
+                    {"code": ["Ensure this field has no more than 10 characters."]}
+                ]
+            },
+        )
+        self.assertFalse(Course.objects.exists())
+
+    def test_a_failing_insert_rolls_back_the_course(self):
+        LearningOutcome.objects.create(code="LO1", description="")
+
+        with self.assertRaises(IntegrityError):
+            self.client.post(reverse("courses"), self.payload(), format="json")
+
+        self.assertFalse(Course.objects.exists())
+
+
+class CourseUpdateTests(APITestCase):
+    """
+    CS101: midterm 60 and final 90 for one student.
+        LO1 = (2 * 60 + 3 * 90) / 5 = 78   -> PO1 weight 3
+        LO2 = 90                           -> PO2 weight 1
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create_user(
+            username="head", email="head@example.com", password="x", role="head"
+        )
+        cls.po1, cls.po2 = [
+            ProgramOutcome.objects.create(code=f"PO{i}", description="") for i in (1, 2)
+        ]
+        cls.course = Course.objects.create(code="CS101", name="Course 1")
+        student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="x",
+            role="student",
+        )
+        cls.midterm = Assesment.objects.create(name="midterm", course=cls.course)
+        cls.final = Assesment.objects.create(name="final", course=cls.course)
+        Assesment.objects.create(name="project", course=cls.course)
+        for assessment, score in ((cls.midterm, 60), (cls.final, 90)):
+            StudentAssessmentScore.objects.create(
+                student=student, assesment=assessment, score=score
+            )
+
+        cls.lo1 = LearningOutcome.objects.create(
+            code="LO1", description="First", course=cls.course
+        )
+        cls.lo2 = LearningOutcome.objects.create(
+            code="LO2", description="Second", course=cls.course
+        )
+        for assessment, lo, weight in (
+            (cls.midterm, cls.lo1, 2),
+            (cls.final, cls.lo1, 3),
+            (cls.final, cls.lo2, 1),
+        ):
+            AssessmentLearningOutcome.objects.create(
+                assesment=assessment, learning_outcome=lo, weight=weight
+            )
+        for lo, program_outcome, weight in (
+            (cls.lo1, cls.po1, 3),
+            (cls.lo2, cls.po2, 1),
+        ):
+            ProgramLearningOutcome.objects.create(
+                learning_outcome=lo, program_outcome=program_outcome, weight=weight
+            )
+        rebuild_attainment()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.head)
+
+    def payload(self, midterm_lo1=2, with_lo2_links=True, with_project=True):
+        lo2_program_outcomes = [{"code": "PO2", "weight": 1}] if with_lo2_links else []
+        final_outcomes = [{"code": "LO1", "weight": 3}]
+        if with_lo2_links:
+            final_outcomes.append({"code": "LO2", "weight": 1})
+        assessments = [
+            {
+                "assessment_type": "midterm",
+                "learning_outcomes": [{"code": "LO1", "weight": midterm_lo1}],
+            },
+            {"assessment_type": "final", "learning_outcomes": final_outcomes},
+        ]
+        if with_project:
+            assessments.append({"assessment_type": "project", "learning_outcomes": []})
+        return {
+            "course_code": "CS101",
+            "course_name": "Course 1",
+            "learning_outcomes": [
+                {
+                    "code": "LO1",
+                    "description": "First",
+                    "program_outcomes": [{"code": "PO1", "weight": 3}],
+                },
+                {
+                    "code": "LO2",
+                    "description": "Second",
+                    "program_outcomes": lo2_program_outcomes,
+                },
+            ],
+            "assessments": assessments,
+        }
+
+    def update(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                reverse("update_course", args=[self.course.id]),
+                payload,
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def program_outcome_attainment(self):
+        return {
+            row.program_outcome_id: (row.weighted_sum, row.weight_sum)
+            for row in self.course.program_outcome_attainments.all()
+        }
+
+    def test_assessments_and_scores_survive(self):
+        score_ids = set(StudentAssessmentScore.objects.values_list("id", flat=True))
+
+        self.update(self.payload(with_project=False))
+
+        # The project was left out of the payload, the others are kept as is.
+        self.assertEqual(
+            set(self.course.assesments.values_list("id", flat=True)),
+            {self.midterm.id, self.final.id},
+        )
+        self.assertEqual(
+            set(StudentAssessmentScore.objects.values_list("id", flat=True)),
+            score_ids,
+        )
+        self.assertEqual(
+            set(self.course.learning_outcomes.values_list("id", flat=True)),
+            {self.lo1.id, self.lo2.id},
+        )
+
+    def test_weight_changes_update_links_in_place(self):
+        link = AssessmentLearningOutcome.objects.get(
+            assesment=self.midterm, learning_outcome=self.lo1
+        )
+
+        self.update(self.payload(midterm_lo1=5))
+
+        link.refresh_from_db()
+        self.assertEqual(link.weight, 5)
+        self.assertEqual(AssessmentLearningOutcome.objects.count(), 3)
+        # LO1 = (5 * 60 + 3 * 90) / 8 = 71.25
+        self.assertEqual(self.lo1.attainment.score, 71.25)
+        self.assertEqual(
+            self.program_outcome_attainment(),
+            {self.po1.id: (213.75, 3), self.po2.id: (90, 1)},
+        )
+
+    def test_removed_links_are_deleted(self):
+        self.update(self.payload(with_lo2_links=False))
+
+        self.assertFalse(
+            AssessmentLearningOutcome.objects.filter(learning_outcome=self.lo2).exists()
+        )
+        self.assertFalse(
+            ProgramLearningOutcome.objects.filter(learning_outcome=self.lo2).exists()
+        )
+        self.lo2.attainment.refresh_from_db()
+        self.assertEqual(self.lo2.attainment.score, 0)
+        self.assertEqual(self.program_outcome_attainment(), {self.po1.id: (234, 3)})
@@ -31,6 +31,26 @@ urlpatterns = [
         views.assign_students,
         name="assign_students",
     ),
+    path(
+        "courses/<int:course_id>/students/add/",
+        views.add_students,
+        name="add_students",
+    ),
+    path(
+        "courses/<int:course_id>/students/remove/",
+        views.remove_students,
+        name="remove_students",
+    ),
+    path(
+        "enrollments/import/",
+        views.import_enrollments_file,
+        name="import_enrollments",
+    ),
+    path(
+        "curriculum/import/",
+        views.import_curriculum_file,
+        name="import_curriculum",
+    ),
     path("courses/<int:course_id>/delete/", views.delete_course, name="delete_course"),
     path(
         "courses/<int:course_id>/evaluate/",
@@ -42,16 +62,28 @@ urlpatterns = [
         views.course_existing_grades,
         name="existing_grades",
     ),
+    path(
+        "courses/<int:course_id>/report/",
+        views.course_report,
+        name="course_report",
+    ),
+    path(
+        "courses/<int:course_id>/grades/import/",
+        views.start_import_grades_task,
+        name="import_grades",
+    ),
     path(
         "courses/<int:course_id>/students/",
         views.filter_students_by_courses,
         name="filter_students_by_courses",
     ),
+    path("scores/load/", views.load_scores, name="load_scores"),
     path(
         "reports/generate/",
         views.generate_reports,
         name="generate_reports",
     ),
+    path("reports/what-if/", views.what_if_report, name="what_if_report"),
     path("tasks/generate/", views.start_generate_task, name="start_generate_task"),
     path(
         "tasks/generate/<task_id>/",
@@ -66,6 +98,11 @@ urlpatterns = [
         views.get_generate_program_suggestions_result,
         name="get_generate",
     ),
+    path(
+        "tasks/import/<task_id>/",
+        views.get_import_task_result,
+        name="get_import_task_result",
+    ),
     path("me/courses/", views.me_courses, name="me_courses"),
     path("token/login/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
@@ -1,12 +1,24 @@
+from api.pagination import KeysetPagination
+from core.attainment import refresh_course_attainment
+from core.blobs import BlobTooLarge, blob_path, store_upload
+from core.imports import (
+    SPREADSHEET_TYPES,
+    import_curriculum,
+    import_enrollments,
+    import_users,
+    iter_csv_dicts,
+    iter_curriculum,
+    iter_enrollment_rows,
+)
 from core.models import (
-    AssessmentLearningOutcome,
     Course,
-    ProgramLearningOutcome,
     ProgramOutcome,
     StudentAssessmentScore,
     User,
 )
-from core.reports import calculate_course_report
+from core.report_cache import get_course_report, get_department_report
+from core.reports import calculate_what_if
+from core.scores import copy_load_scores, parse_score, upsert_scores
 from core.serializers import (
     CourseCreateSerializer,
     CourseDetailSerializer,
@@ -17,7 +29,17 @@ from core.serializers import (
     StudentCreateSerializer,
     TeacherCreateSerializer,
     UserSerializer,
+    WhatIfScenarioSerializer,
+)
+from core.tasks import (
+    import_curriculum_task,
+    import_enrollments_task,
+    import_grades,
+    import_users_task,
 )
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
@@ -60,22 +82,37 @@ def me(request):
     )
 
 
+def _search_users(users, request):
+    search = request.query_params.get("search")
+    if search:
+        users = users.filter(
+            Q(username__startswith=search) | Q(email__startswith=search)
+        )
+    return users
+
+
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def teachers(request):
     if request.method == "GET":
-        teachers = User.objects.filter(role="teacher")
-        serializer = UserSerializer(teachers, many=True)
-        return Response({"teachers": serializer.data})
+        teachers = _search_users(User.objects.filter(role="teacher"), request)
+        paginator = KeysetPagination(ordering="username")
+        page = paginator.paginate_queryset(teachers, request)
+        serializer = UserSerializer(page, many=True)
+        return paginator.get_paginated_response("teachers", serializer.data)
 
     elif request.method == "POST":
-        serializer = TeacherCreateSerializer(data=request.data)
+        # A list creates the whole batch at once, or nothing if any item fails.
+        many = isinstance(request.data, list)
+        serializer = TeacherCreateSerializer(data=request.data, many=many)
         if serializer.is_valid():
-            serializer.save()
-            return Response(
-                {"message": "Teacher created successfully."},
-                status=status.HTTP_201_CREATED,
+            created = serializer.save()
+            message = (
+                f"{len(created)} teachers created successfully."
+                if many
+                else "Teacher created successfully."
             )
+            return Response({"message": message}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -108,44 +145,46 @@ def bulk_upload_teachers(request):
     if not file:
         return Response({"detail": "No file provided"}, status=400)
 
-    import csv
-    import io
-
-    decoded_file = io.TextIOWrapper(file, encoding="utf-8")
-    reader = csv.DictReader(decoded_file)
-    created = 0
+    try:
+        blob_key = store_upload(file)
+    except BlobTooLarge as e:
+        return Response({"detail": str(e)}, status=413)
+    if file.size > settings.IMPORT_SYNC_MAX_BYTES:
+        task = import_users_task.delay(blob_key, "teacher")
+        return Response({"task_id": task.id}, status=202)
 
-    for row in reader:
-        try:
-            _ = User.objects.create_user(
-                username=row["username"],
-                email=row["email"],
-                role="teacher",
-                password="dionysos",
-            )
-            created += 1
-        except Exception as e:
-            continue
+    result = import_users(iter_csv_dicts(blob_path(blob_key)), "teacher")
 
-    return Response({"message": f"{created} teachers created successfully."})
+    return Response(
+        {
+            "message": f"{result['created']} teachers created successfully.",
+            **result,
+        }
+    )
 
 
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def students(request):
     if request.method == "GET":
-        students = User.objects.filter(role="student")
-        serializer = UserSerializer(students, many=True)
-        return Response({"students": serializer.data})
+        students = _search_users(User.objects.filter(role="student"), request)
+        paginator = KeysetPagination(ordering="username")
+        page = paginator.paginate_queryset(students, request)
+        serializer = UserSerializer(page, many=True)
+        return paginator.get_paginated_response("students", serializer.data)
 
     elif request.method == "POST":
-        serializer = StudentCreateSerializer(data=request.data)
+        # A list creates the whole batch at once, or nothing if any item fails.
+        many = isinstance(request.data, list)
+        serializer = StudentCreateSerializer(data=request.data, many=many)
         if serializer.is_valid():
-            serializer.save()
-            return Response(
-                {"message": "Student created successfully."},
-                status=status.HTTP_201_CREATED,
+            created = serializer.save()
+            message = (
+                f"{len(created)} students created successfully."
+                if many
+                else "Student created successfully."
             )
+            return Response({"message": message}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -178,26 +217,22 @@ def bulk_upload_students(request):
     if not file:
         return Response({"detail": "No file provided"}, status=400)
 
-    import csv
-    import io
-
-    decoded_file = io.TextIOWrapper(file, encoding="utf-8")
-    reader = csv.DictReader(decoded_file)
-    created = 0
+    try:
+        blob_key = store_upload(file)
+    except BlobTooLarge as e:
+        return Response({"detail": str(e)}, status=413)
+    if file.size > settings.IMPORT_SYNC_MAX_BYTES:
+        task = import_users_task.delay(blob_key, "student")
+        return Response({"task_id": task.id}, status=202)
 
-    for row in reader:
-        try:
-            _ = User.objects.create_user(
-                username=row["username"],
-                email=row["email"],
-                role="student",
-                password="dionysos",
-            )
-            created += 1
-        except Exception as e:
-            continue
+    result = import_users(iter_csv_dicts(blob_path(blob_key)), "student")
 
-    return Response({"message": f"{created} students created successfully."})
+    return Response(
+        {
+            "message": f"{result['created']} students created successfully.",
+            **result,
+        }
+    )
 
 
 @api_view(["GET", "POST"])
@@ -262,8 +297,18 @@ def courses(request):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        serializer = CourseSummarySerializer(courses_qs, many=True)
-        return Response({"courses": serializer.data})
+        created_by = request.query_params.get("created_by")
+        if created_by:
+            courses_qs = courses_qs.filter(created_by__username=created_by)
+        code = request.query_params.get("code")
+        if code:
+            courses_qs = courses_qs.filter(code__startswith=code)
+
+        courses_qs = CourseSummarySerializer.setup_queryset(courses_qs)
+        paginator = KeysetPagination(ordering="code")
+        page = paginator.paginate_queryset(courses_qs, request)
+        serializer = CourseSummarySerializer(page, many=True)
+        return paginator.get_paginated_response("courses", serializer.data)
 
     elif request.method == "POST":
         serializer = CourseCreateSerializer(
@@ -291,7 +336,7 @@ def course_detail(request, course_id):
             status=status.HTTP_403_FORBIDDEN,
         )
     try:
-        course = Course.objects.get(id=course_id)
+        course = CourseDetailSerializer.setup_queryset(Course.objects).get(id=course_id)
     except Course.DoesNotExist:
         return Response(
             {"detail": "Course not found"}, status=status.HTTP_404_NOT_FOUND
@@ -317,18 +362,24 @@ def filter_students_by_courses(request, course_id):
             {"detail": "Course not found"}, status=status.HTTP_404_NOT_FOUND
         )
 
-    students = User.objects.filter(role="student")
-    data = [
-        {
-            "id": student.id,
-            "username": student.username,
-            "email": student.email,
-            "selected": course.students.filter(id=student.id).exists(),
-        }
-        for student in students
-    ]
+    students = (
+        _search_users(User.objects.filter(role="student"), request)
+        .annotate(
+            selected=Exists(
+                User.courses.through.objects.filter(
+                    course=course, user_id=OuterRef("pk")
+                )
+            )
+        )
+        .values("id", "username", "email", "selected")
+    )
+
+    if request.query_params.get("selected") in ("true", "1"):
+        students = students.filter(selected=True)
 
-    return Response({"students": data}, status=status.HTTP_200_OK)
+    paginator = KeysetPagination(ordering="username")
+    page = paginator.paginate_queryset(students, request)
+    return paginator.get_paginated_response("students", page)
 
 
 @api_view(["POST"])
@@ -363,6 +414,134 @@ def assign_students(request, course_id):
     )
 
 
+def _student_ids_from_request(request):
+    student_ids = request.data.get("students", [])
+    if not isinstance(student_ids, list):
+        return None
+    try:
+        return {int(student_id) for student_id in student_ids}
+    except (TypeError, ValueError):
+        return None
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def add_students(request, course_id):
+    if not head_or_teacher_required(request.user):
+        return Response(
+            {"detail": "You do not have permission to assign students."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    try:
+        course = Course.objects.get(id=course_id)
+    except Course.DoesNotExist:
+        return Response(
+            {"detail": "Course not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+
+    student_ids = _student_ids_from_request(request)
+    if student_ids is None:
+        return Response(
+            {"detail": "students must be a list of IDs."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    Enrollment = User.courses.through
+    new_ids = (
+        User.objects.filter(id__in=student_ids, role="student")
+        .exclude(courses=course)
+        .values_list("id", flat=True)
+    )
+    enrollments = Enrollment.objects.bulk_create(
+        [Enrollment(user_id=student_id, course=course) for student_id in new_ids],
+        ignore_conflicts=True,
+    )
+
+    return Response(
+        {"detail": f"{len(enrollments)} students added to {course.name}."},
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def remove_students(request, course_id):
+    if not head_or_teacher_required(request.user):
+        return Response(
+            {"detail": "You do not have permission to assign students."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    try:
+        course = Course.objects.get(id=course_id)
+    except Course.DoesNotExist:
+        return Response(
+            {"detail": "Course not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+
+    student_ids = _student_ids_from_request(request)
+    if student_ids is None:
+        return Response(
+            {"detail": "students must be a list of IDs."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    removed, _ = User.courses.through.objects.filter(
+        course=course, user_id__in=student_ids
+    ).delete()
+
+    return Response(
+        {"detail": f"{removed} students removed from {course.name}."},
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def import_enrollments_file(request):
+    file = request.FILES.get("file")
+    if not file:
+        return Response({"detail": "No file provided"}, status=400)
+
+    try:
+        blob_key = store_upload(file)
+    except BlobTooLarge as e:
+        return Response({"detail": str(e)}, status=413)
+    if file.size > settings.IMPORT_SYNC_MAX_BYTES:
+        task = import_enrollments_task.delay(blob_key)
+        return Response({"task_id": task.id}, status=202)
+
+    result = import_enrollments(iter_enrollment_rows(blob_path(blob_key)))
+
+    return Response(result)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def import_curriculum_file(request):
+    file = request.FILES.get("file")
+    if not file:
+        return Response({"detail": "No file provided"}, status=400)
+    if not file.name.lower().endswith((".json", ".ndjson", ".jsonl")):
+        return Response({"detail": "Unsupported file type"}, status=400)
+
+    try:
+        blob_key = store_upload(file)
+    except BlobTooLarge as e:
+        return Response({"detail": str(e)}, status=413)
+    if file.size > settings.IMPORT_SYNC_MAX_BYTES:
+        task = import_curriculum_task.delay(blob_key, request.user.id)
+        return Response({"task_id": task.id}, status=202)
+
+    try:
+        result = import_curriculum(iter_curriculum(blob_path(blob_key)), request.user)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+
+    return Response(result)
+
+
 @api_view(["PUT"])
 @permission_classes([IsAuthenticated])
 def update_course(request, course_id):
@@ -426,7 +605,9 @@ def delete_course(request, course_id):
 import json
 
 from celery.result import AsyncResult
-from core.tasks import generate
+from core.blobs import blob_digest
+from core.generate_cache import get_cached_result
+from core.tasks import GENERATE_PROMPT_VERSION, generate
 
 
 @api_view(["POST"])
@@ -449,10 +630,19 @@ def start_generate_task(request):
         f"{po['code']}: {po['description']}" for po in program_outcomes_list
     )
 
-    file_bytes = uploaded_file.read()
-    filename = uploaded_file.name
+    try:
+        blob_key = store_upload(uploaded_file)
+    except BlobTooLarge as e:
+        return Response({"error": str(e)}, status=413)
+
+    # The same syllabus with the same program outcomes was already mapped.
+    cached = get_cached_result(
+        blob_digest(blob_key), program_outcomes_str, GENERATE_PROMPT_VERSION
+    )
+    if cached is not None:
+        return Response({"status": "SUCCESS", "result": cached, "cached": True})
 
-    task = generate.delay(file_bytes, filename, program_outcomes_str)
+    task = generate.delay(blob_key, program_outcomes_str)
 
     return Response(
         {
@@ -487,47 +677,57 @@ def evaluate_course(request, course_id):
     if not isinstance(grades, dict):
         return Response({"detail": "grades must be an object"}, status=400)
 
-    assessments = {a.id: a for a in course.assesments.all()}
+    assessments = set(course.assesments.values_list("id", flat=True))
 
     saved = []
     errors = []
 
-    for student_no, grade_map in grades.items():
-        try:
-            student = User.objects.get(username=student_no, role="student")
-        except User.DoesNotExist:
-            errors.append(f"{student_no}: student not found")
-            continue
-
-        if not isinstance(grade_map, dict):
-            errors.append(f"{student_no}: grades must be an object")
-            continue
-
-        for assessment_id, score in grade_map.items():
-            try:
-                assessment_id = int(assessment_id)
-            except (TypeError, ValueError):
-                errors.append(f"{student_no}: invalid assessment id")
+    with transaction.atomic():
+        students = User.objects.filter(
+            username__in=list(grades.keys()), role="student"
+        ).in_bulk(field_name="username")
+
+        scores = {}
+        for student_no, grade_map in grades.items():
+            student = students.get(student_no)
+            if not student:
+                errors.append(f"{student_no}: student not found")
                 continue
 
-            assesment = assessments.get(assessment_id)
-            if not assesment:
-                errors.append(f"{student_no}: assessment {assessment_id} not in course")
+            if not isinstance(grade_map, dict):
+                errors.append(f"{student_no}: grades must be an object")
                 continue
 
-            StudentAssessmentScore.objects.update_or_create(
-                student=student,
-                assesment=assesment,
-                defaults={"score": score},
-            )
+            for assessment_id, score in grade_map.items():
+                try:
+                    assessment_id = int(assessment_id)
+                except (TypeError, ValueError):
+                    errors.append(f"{student_no}: invalid assessment id")
+                    continue
+
+                if assessment_id not in assessments:
+                    errors.append(
+                        f"{student_no}: assessment {assessment_id} not in course"
+                    )
+                    continue
+
+                try:
+                    new_score = parse_score(score)
+                except (TypeError, ValueError):
+                    errors.append(f"{student_no}: invalid score for {assessment_id}")
+                    continue
+
+                scores[(student.id, assessment_id)] = new_score
+                saved.append(
+                    {
+                        "student": student_no,
+                        "assessment_id": assessment_id,
+                        "score": score,
+                    }
+                )
 
-            saved.append(
-                {
-                    "student": student_no,
-                    "assessment_id": assessment_id,
-                    "score": score,
-                }
-            )
+        upsert_scores(scores)
+        refresh_course_attainment([course.id])
 
     return Response(
         {
@@ -537,6 +737,65 @@ def evaluate_course(request, course_id):
     )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def start_import_grades_task(request, course_id):
+    if not head_or_teacher_required(request.user):
+        return Response(
+            {"detail": "You do not have permission to grade this course."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    if not Course.objects.filter(id=course_id).exists():
+        return Response({"detail": "Course not found"}, status=404)
+
+    uploaded_file = request.FILES.get("file")
+    if not uploaded_file:
+        return Response({"error": "No file provided"}, status=400)
+
+    if not uploaded_file.name.lower().endswith(SPREADSHEET_TYPES):
+        return Response({"error": "Unsupported file type"}, status=400)
+
+    try:
+        blob_key = store_upload(uploaded_file)
+    except BlobTooLarge as e:
+        return Response({"error": str(e)}, status=413)
+
+    task = import_grades.delay(course_id, blob_key)
+    return Response({"task_id": task.id}, status=202)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_import_task_result(request, task_id):
+    task = AsyncResult(task_id)
+    if task.state == "SUCCESS":
+        return Response({"status": "SUCCESS", "result": task.result})
+    elif task.state == "FAILURE":
+        return Response({"status": "FAILURE", "error": str(task.result)})
+    elif task.state == "PROGRESS":
+        return Response({"status": "PROGRESS", "progress": task.info})
+    else:
+        return Response({"status": task.state})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def load_scores(request):
+    uploaded_file = request.FILES.get("file")
+    if not uploaded_file:
+        return Response({"detail": "No file provided"}, status=400)
+
+    try:
+        result = copy_load_scores(uploaded_file)
+    except NotImplementedError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    except DatabaseError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(result)
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def course_existing_grades(request, course_id):
@@ -545,6 +804,23 @@ def course_existing_grades(request, course_id):
     except Course.DoesNotExist:
         return Response({"detail": "Course not found"}, status=404)
 
+    if request.query_params.get("layout") == "columnar":
+        try:
+            offset = int(request.query_params.get("offset", 0))
+            limit = int(request.query_params.get("limit", settings.API_MAX_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {"detail": "offset and limit must be integers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if offset < 0 or limit < 0:
+            return Response(
+                {"detail": "offset and limit must not be negative."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = min(limit, settings.API_MAX_PAGE_SIZE)
+        return Response(_columnar_grades(course, offset, limit))
+
     scores = StudentAssessmentScore.objects.filter(
         assesment__course=course
     ).select_related("student", "assesment")
@@ -561,112 +837,106 @@ def course_existing_grades(request, course_id):
     return Response(result)
 
 
+def _columnar_grades(course, offset, limit):
+    """
+    Builds the grade grid in rows [offset, offset + limit) ordered by username,
+    with assessments ordered by id. Missing scores are None. Like the nested
+    layout, students who have scores in the course are listed even when they
+    are no longer enrolled; enrolled students without scores are listed too.
+
+    Returns: {
+        "total_students": int,
+        "offset": int,
+        "students": [username, ...],
+        "assessments": [{"id", "name"}, ...],
+        "scores": [[score | None, ...], ...]  # one row per student
+    }
+    """
+    students = User.objects.filter(
+        Exists(
+            course.students.through.objects.filter(
+                user_id=OuterRef("pk"), course_id=course.id
+            )
+        )
+        | Exists(
+            StudentAssessmentScore.objects.filter(
+                student_id=OuterRef("pk"), assesment__course=course
+            )
+        )
+    ).order_by("username")
+    rows = list(students.values_list("id", "username")[offset : offset + limit])
+    assessments = list(course.assesments.order_by("id").values_list("id", "name"))
+
+    row_index = {student_id: i for i, (student_id, _) in enumerate(rows)}
+    column_index = {assesment_id: j for j, (assesment_id, _) in enumerate(assessments)}
+    matrix = [[None] * len(assessments) for _ in rows]
+
+    for student_id, assesment_id, score in StudentAssessmentScore.objects.filter(
+        assesment_id__in=column_index, student_id__in=row_index
+    ).values_list("student_id", "assesment_id", "score"):
+        matrix[row_index[student_id]][column_index[assesment_id]] = score
+
+    return {
+        "total_students": students.count(),
+        "offset": offset,
+        "students": [username for _, username in rows],
+        "assessments": [
+            {"id": assesment_id, "name": name} for assesment_id, name in assessments
+        ],
+        "scores": matrix,
+    }
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def generate_reports(request):
     if request.user.role != "head":
         return Response({"detail": "Forbidden"}, status=403)
 
-    courses = Course.objects.all()
-
-    program_outcome_totals = {}
-    program_outcome_weights = {}
-
-    course_reports = []
-
-    for course in courses:
-        assessments = course.assesments.all()
-
-        # 🔹 TYPE COUNTERS (midterm → 1,2 / final → 1 ...)
-        type_counters = {}
-
-        # --- 1️⃣ Assessment averages + LABEL ---
-        assessment_results = {}
-
-        for a in assessments:
-            scores = StudentAssessmentScore.objects.filter(assesment=a)
-            avg = (
-                sum(s.score for s in scores) / scores.count() if scores.exists() else 0
-            )
+    return Response(get_department_report())
 
-            # 🔹 Counter
-            type_counters[a.name] = type_counters.get(a.name, 0) + 1
 
-            label = f"{a.get_name_display()} {type_counters[a.name]}"
-
-            assessment_results[str(a.id)] = {
-                "label": label,  # ✅ Midterm 1, Midterm 2
-                "average": round(avg, 2),
-            }
-
-        # --- 2️⃣ Learning Outcome scores (hesaplama only) ---
-        lo_scores = {}
-
-        for lo in course.learning_outcomes.all():
-            total = 0
-            weight_sum = 0
-
-            alos = AssessmentLearningOutcome.objects.filter(
-                learning_outcome=lo,
-                assesment__course=course,
-            )
-
-            for alo in alos:
-                ass_id = str(alo.assesment.id)
-                avg = assessment_results.get(ass_id, {}).get("average", 0)
-
-                total += avg * alo.weight
-                weight_sum += alo.weight
-
-            lo_scores[lo.id] = total / weight_sum if weight_sum else 0
-
-        # --- 3️⃣ Program Outcome contributions ---
-        course_po_contrib = {}
-
-        for lo in course.learning_outcomes.all():
-            lo_score = lo_scores.get(lo.id, 0)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def course_report(request, course_id):
+    if not head_or_teacher_required(request.user):
+        return Response(
+            {"detail": "You do not have permission to access this course."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
 
-            for plo in ProgramLearningOutcome.objects.filter(learning_outcome=lo):
-                po_code = plo.program_outcome.code
-                weighted = lo_score * plo.weight
+    try:
+        course = Course.objects.get(id=course_id)
+    except Course.DoesNotExist:
+        return Response(
+            {"detail": "Course not found"}, status=status.HTTP_404_NOT_FOUND
+        )
 
-                program_outcome_totals[po_code] = (
-                    program_outcome_totals.get(po_code, 0) + weighted
-                )
-                program_outcome_weights[po_code] = (
-                    program_outcome_weights.get(po_code, 0) + plo.weight
-                )
+    return Response(get_course_report(course))
 
-                course_po_contrib[po_code] = (
-                    course_po_contrib.get(po_code, 0) + weighted
-                )
 
-        course_reports.append(
-            {
-                "course_code": course.code,
-                "course_name": course.name,
-                "assessments": assessment_results,
-                "program_outcome_contribution": {
-                    k: round(v, 2) for k, v in course_po_contrib.items()
-                },
-            }
-        )
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def what_if_report(request):
+    if request.user.role != "head":
+        return Response({"detail": "Forbidden"}, status=403)
 
-    # --- 4️⃣ GLOBAL Program Outcomes ---
-    final_program_outcomes = {}
+    serializer = WhatIfScenarioSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    for po, total in program_outcome_totals.items():
-        final_program_outcomes[po] = round(
-            total / program_outcome_weights[po] if program_outcome_weights[po] else 0,
-            2,
+    scenario = serializer.validated_data
+    try:
+        result = calculate_what_if(
+            course_ids=scenario.get("courses"),
+            assessment_weights=scenario.get("assessment_weights", []),
+            program_outcome_weights=scenario.get("program_outcome_weights", []),
+            score_shifts=scenario.get("score_shifts"),
         )
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    return Response(
-        {
-            "reports": course_reports,
-            "program_outcomes": final_program_outcomes,
-        }
-    )
+    return Response(result)
 
 
 from core.tasks import generate_program_suggestions
@@ -701,22 +971,19 @@ def me_courses(request):
             {"detail": "Only students can access their courses"}, status=403
         )
 
-    # Öğrencinin kayıtlı olduğu tüm kurslar
+    # Öğrencinin kayıtlı olduğu tüm kurslar, yalnızca kendi notlarıyla
     courses = user.courses.prefetch_related(
-        "assesments", "assesments__student_scores"
-    ).all()
+        "assesments",
+        Prefetch(
+            "assesments__student_scores",
+            queryset=StudentAssessmentScore.objects.filter(student=user),
+            to_attr="own_scores",
+        ),
+    )
 
     result = []
 
     for course in courses:
-
-        grades = {
-            score.assesment.id: score.score
-            for score in StudentAssessmentScore.objects.filter(
-                student=user, assesment__course=course
-            )
-        }
-
         course_data = {
             "id": course.id,
             "code": course.code,
@@ -725,7 +992,7 @@ def me_courses(request):
                 {
                     "id": a.id,
                     "name": a.get_name_display(),
-                    "score": grades.get(a.id, None),
+                    "score": a.own_scores[0].score if a.own_scores else None,
                 }
                 for a in course.assesments.all()
             ],
@@ -71,6 +71,50 @@ DATABASES = {
     }
 }
 
+# Cache
+# Reports are cached in Redis when REDIS_CACHE_URL is set (docker-compose does),
+# otherwise in process memory. docker-compose gives the cache its own
+# memory-bounded Redis, apart from the unbounded Celery broker.
+REDIS_CACHE_URL = os.environ.get("REDIS_CACHE_URL")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+REPORT_CACHE_LOCK_TIMEOUT = 30
+
+# Syllabus mapping results are cached by file hash, program outcomes and prompt
+# version; extracted texts by file hash. Texts longer than the limit (in
+# characters) are not cached.
+GENERATE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+GENERATE_TEXT_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+GENERATE_TEXT_CACHE_MAX_LENGTH = 1024 * 1024
+# Only the syllabus sections the mapping prompt needs are sent, cut to this
+# many tokens.
+GENERATE_SYLLABUS_TOKEN_BUDGET = 3000
+
+# Syllabus PDFs are read with PDFium ("pdfium") or the slower layout-aware
+# pdfplumber ("pdfplumber"). PDFs with at least PDF_PARALLEL_MIN_PAGES
+# uncached pages are split across PDF_EXTRACT_WORKERS processes.
+PDF_TEXT_BACKEND = os.environ.get("PDF_TEXT_BACKEND", "pdfium")
+PDF_EXTRACT_WORKERS = int(
+    os.environ.get("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1))
+)
+PDF_PARALLEL_MIN_PAGES = 16
+# Syllabus DOCX files are streamed from their XML ("stream") or read through
+# python-docx ("python-docx").
+DOCX_TEXT_BACKEND = os.environ.get("DOCX_TEXT_BACKEND", "stream")
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -89,6 +133,21 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 
+# Content-addressed store for uploaded files handed over to Celery tasks. The
+# directory must be shared by the backend and celery containers.
+BLOB_DIR = os.environ.get("BLOB_DIR", BASE_DIR / "blobs")
+BLOB_MAX_BYTES = int(os.environ.get("BLOB_MAX_BYTES", 50 * 1024 * 1024))
+# Blobs not uploaded again within this many seconds are removed by the
+# cleanup_blobs_task beat job.
+BLOB_TTL = int(os.environ.get("BLOB_TTL", 60 * 60 * 24))
+# Partial uploads left in BLOB_DIR/tmp by crashed workers are removed after
+# this many seconds. Kept well above the time any single upload can take.
+BLOB_TMP_TTL = int(os.environ.get("BLOB_TMP_TTL", 60 * 60 * 24 * 7))
+
+# Roster and enrollment files larger than this are imported by a Celery task
+# instead of in-request.
+IMPORT_SYNC_MAX_BYTES = 100 * 1024
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "core.User"
@@ -102,6 +161,10 @@ REST_FRAMEWORK = {
     )
 }
 
+# Default and maximum page sizes of the cursor-paginated list endpoints.
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 100))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 1000))
+
 # ---------------------------
 # CORS SETTINGS FOR SVELTEKIT
 # ---------------------------
@@ -143,3 +206,9 @@ CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://redis:6
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
+CELERY_BEAT_SCHEDULE = {
+    "cleanup-blobs": {
+        "task": "core.tasks.cleanup_blobs_task",
+        "schedule": 60 * 60,
+    },
+}
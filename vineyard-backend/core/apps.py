@@ -5,3 +5,6 @@ from django.contrib.auth import get_user_model
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from . import signals  # noqa: F401
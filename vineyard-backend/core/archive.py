@@ -0,0 +1,496 @@
+import gzip
+import json
+import sys
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .attainment import schedule_course_refresh
+from .models import (
+    Assesment,
+    AssessmentLearningOutcome,
+    Course,
+    LearningOutcome,
+    ProgramLearningOutcome,
+    ProgramOutcome,
+    StudentAssessmentScore,
+    User,
+)
+from .scores import upsert_scores
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_CHUNK_SIZE = 2000
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Record types in dependency order, with the fields written for each. Foreign
+# keys are written as natural keys: program outcome / learning outcome /
+# course codes, usernames and (course code, assessment name, ordinal) triples.
+# A course may have several assessments with the same name; the ordinal
+# numbers them from 1 in id order. The "ordinal" field is looked up from the
+# assessment id in the matching position.
+ARCHIVE_RECORDS = (
+    (
+        "program_outcome",
+        ProgramOutcome.objects.all(),
+        ("code", "description"),
+        ("code", "description"),
+    ),
+    (
+        "user",
+        User.objects.all(),
+        (
+            "username",
+            "email",
+            "role",
+            "first_name",
+            "last_name",
+        ),
+        (
+            "username",
+            "email",
+            "role",
+            "first_name",
+            "last_name",
+        ),
+    ),
+    (
+        "course",
+        Course.objects.all(),
+        ("code", "name", "created_by__username"),
+        ("code", "name", "created_by"),
+    ),
+    (
+        "learning_outcome",
+        LearningOutcome.objects.all(),
+        ("code", "description", "course__code", "created_by__username"),
+        ("code", "description", "course", "created_by"),
+    ),
+    (
+        "program_learning_outcome",
+        ProgramLearningOutcome.objects.all(),
+        ("learning_outcome__code", "program_outcome__code", "weight"),
+        ("learning_outcome", "program_outcome", "weight"),
+    ),
+    (
+        "assessment",
+        Assesment.objects.all(),
+        ("course__code", "name", "id", "created_by__username"),
+        ("course", "name", "ordinal", "created_by"),
+    ),
+    (
+        "assessment_learning_outcome",
+        AssessmentLearningOutcome.objects.all(),
+        (
+            "assesment__course__code",
+            "assesment__name",
+            "assesment_id",
+            "learning_outcome__code",
+            "weight",
+        ),
+        ("course", "assessment", "ordinal", "learning_outcome", "weight"),
+    ),
+    (
+        "enrollment",
+        User.courses.through.objects.all(),
+        ("course__code", "user__username"),
+        ("course", "username"),
+    ),
+    (
+        "score",
+        StudentAssessmentScore.objects.all(),
+        (
+            "assesment__course__code",
+            "assesment__name",
+            "assesment_id",
+            "student__username",
+            "score",
+        ),
+        ("course", "assessment", "ordinal", "username", "score"),
+    ),
+)
+
+
+def open_archive(path, mode="r", compress=None):
+    """
+    Opens an archive for text reading or writing; '-' is stdin/stdout.
+
+    Reading detects gzip from the file's magic bytes. Writing compresses when
+    `compress` is True, or when it is None and the path ends with ".gz".
+    """
+    if mode == "r":
+        if path == "-":
+            return sys.stdin
+        with open(path, "rb") as f:
+            compressed = f.read(2) == GZIP_MAGIC
+        if compressed:
+            return gzip.open(path, "rt", encoding="utf-8")
+        return open(path, encoding="utf-8")
+
+    if compress is None:
+        compress = path.endswith(".gz")
+    if path == "-":
+        if compress:
+            return gzip.open(sys.stdout.buffer, "wt", encoding="utf-8")
+        return sys.stdout
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def dump_archive(out):
+    """
+    Writes every course, outcome, mapping, enrollment and score to the text
+    stream `out` as NDJSON, one {"type": ..., ...} record per line. Rows are
+    streamed from server-side cursors, so memory does not grow with the data.
+
+    Returns {type: records written}.
+    """
+    ordinals = dict(
+        Assesment.objects.annotate(
+            ordinal=Window(
+                RowNumber(),
+                partition_by=[F("course"), F("name")],
+                order_by=F("id").asc(),
+            )
+        ).values_list("id", "ordinal")
+    )
+    counts = {}
+    for record_type, queryset, lookups, fields in ARCHIVE_RECORDS:
+        count = 0
+        rows = queryset.order_by("pk").values_list(*lookups)
+        for row in rows.iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+            record = {"type": record_type, **dict(zip(fields, row))}
+            if "ordinal" in record:
+                record["ordinal"] = ordinals[record["ordinal"]]
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+        counts[record_type] = count
+    return counts
+
+
+def iter_archive(stream):
+    """
+    Yields the records of an NDJSON archive one at a time.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON on line {line_number}")
+
+
+def _ids_by(model, field, values):
+    values = {value for value in values if value is not None}
+    if not values:
+        return {}
+    return dict(
+        model.objects.filter(**{f"{field}__in": values}).values_list(field, "id")
+    )
+
+
+def _assessment_key(record):
+    # Archives written before ordinals were added hold one assessment per name.
+    return record["course"], record["assessment"], record.get("ordinal", 1)
+
+
+def _assessment_ids(keys):
+    """
+    Returns {(course code, name, ordinal): id} for the assessments of the
+    courses in `keys`.
+    """
+    ids = {}
+    seen = Counter()
+    for course_code, name, assesment_id in (
+        Assesment.objects.filter(course__code__in={key[0] for key in keys})
+        .order_by("id")
+        .values_list("course__code", "name", "id")
+    ):
+        seen[(course_code, name)] += 1
+        ids[(course_code, name, seen[(course_code, name)])] = assesment_id
+    return ids
+
+
+def _restore_program_outcomes(batch, touched):
+    rows = {record["code"]: record for record in batch}
+    ProgramOutcome.objects.bulk_create(
+        [
+            ProgramOutcome(code=code, description=record.get("description", ""))
+            for code, record in rows.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["code"],
+        update_fields=["description"],
+    )
+    return len(batch), 0
+
+
+def _restore_users(batch, touched):
+    usernames = User.objects.filter(
+        username__in={record["username"] for record in batch}
+    )
+    before = usernames.count()
+    User.objects.bulk_create(
+        [
+            User(
+                username=record["username"],
+                email=record["email"],
+                role=record["role"],
+                first_name=record.get("first_name", ""),
+                last_name=record.get("last_name", ""),
+                # Staff and superuser flags are never taken from an archive,
+                # which could grant them to anyone; as when creating users,
+                # teachers and heads are staff.
+                is_staff=record["role"] in ("teacher", "head"),
+                # Passwords are never archived, and a known default would let
+                # anyone into restored accounts, so each needs a reset.
+                password=make_password(None),
+            )
+            for record in batch
+        ],
+        ignore_conflicts=True,
+    )
+    # Existing users and rows clashing on email are left alone.
+    inserted = usernames.count() - before
+    return inserted, len(batch) - inserted
+
+
+def _restore_courses(batch, touched):
+    users = _ids_by(User, "username", (record.get("created_by") for record in batch))
+    Course.objects.bulk_create(
+        [
+            Course(
+                code=record["code"],
+                name=record["name"],
+                created_by_id=users.get(record.get("created_by")),
+            )
+            for record in batch
+        ],
+        update_conflicts=True,
+        unique_fields=["code"],
+        update_fields=["name", "created_by"],
+    )
+    return len(batch), 0
+
+
+def _restore_learning_outcomes(batch, touched):
+    courses = _ids_by(Course, "code", (record.get("course") for record in batch))
+    users = _ids_by(User, "username", (record.get("created_by") for record in batch))
+    LearningOutcome.objects.bulk_create(
+        [
+            LearningOutcome(
+                code=record["code"],
+                description=record.get("description", ""),
+                course_id=courses.get(record.get("course")),
+                created_by_id=users.get(record.get("created_by")),
+            )
+            for record in batch
+        ],
+        update_conflicts=True,
+        unique_fields=["code"],
+        update_fields=["description", "course", "created_by"],
+    )
+    touched.update(courses.values())
+    return len(batch), 0
+
+
+def _restore_assessments(batch, touched):
+    courses = _ids_by(Course, "code", (record["course"] for record in batch))
+    # Assessments already there per (course, name); the archive lists them in
+    # ordinal order, so the ones past that count are new.
+    existing = Counter(
+        Assesment.objects.filter(course_id__in=courses.values()).values_list(
+            "course_id", "name"
+        )
+    )
+    users = _ids_by(User, "username", (record.get("created_by") for record in batch))
+
+    assessments = []
+    skipped = 0
+    for record in batch:
+        course_id = courses.get(record["course"])
+        key = (course_id, record["name"])
+        if course_id is None:
+            skipped += 1
+        elif existing[key] < record.get("ordinal", 1):
+            existing[key] += 1
+            assessments.append(
+                Assesment(
+                    course_id=course_id,
+                    name=record["name"],
+                    created_by_id=users.get(record.get("created_by")),
+                )
+            )
+    Assesment.objects.bulk_create(assessments)
+    touched.update(courses.values())
+    return len(batch) - skipped, skipped
+
+
+def _restore_weighted_links(model, key_fields, links):
+    """
+    Inserts or re-weights {(id, id): weight} links keyed by `key_fields`.
+    """
+    existing = {}
+    for link in model.objects.filter(
+        **{f"{key_fields[0]}__in": {key[0] for key in links}}
+    ):
+        existing.setdefault(tuple(getattr(link, field) for field in key_fields), link)
+
+    changed = []
+    missing = []
+    for key, weight in links.items():
+        link = existing.get(key)
+        if link is None:
+            missing.append(model(**dict(zip(key_fields, key)), weight=weight))
+        elif link.weight != weight:
+            link.weight = weight
+            changed.append(link)
+    model.objects.bulk_update(changed, ["weight"])
+    model.objects.bulk_create(missing)
+
+
+def _restore_program_links(batch, touched):
+    learning_outcomes = _ids_by(
+        LearningOutcome, "code", (record["learning_outcome"] for record in batch)
+    )
+    program_outcomes = _ids_by(
+        ProgramOutcome, "code", (record["program_outcome"] for record in batch)
+    )
+    links = {}
+    skipped = 0
+    for record in batch:
+        lo_id = learning_outcomes.get(record["learning_outcome"])
+        po_id = program_outcomes.get(record["program_outcome"])
+        if lo_id is None or po_id is None:
+            skipped += 1
+        else:
+            links[(lo_id, po_id)] = record["weight"]
+
+    _restore_weighted_links(
+        ProgramLearningOutcome, ("learning_outcome_id", "program_outcome_id"), links
+    )
+    touched.update(
+        LearningOutcome.objects.filter(id__in={lo_id for lo_id, _ in links})
+        .exclude(course_id=None)
+        .values_list("course_id", flat=True)
+    )
+    return len(batch) - skipped, skipped
+
+
+def _restore_assessment_links(batch, touched):
+    assessments = _assessment_ids({_assessment_key(record) for record in batch})
+    learning_outcomes = _ids_by(
+        LearningOutcome, "code", (record["learning_outcome"] for record in batch)
+    )
+    links = {}
+    skipped = 0
+    for record in batch:
+        assesment_id = assessments.get(_assessment_key(record))
+        lo_id = learning_outcomes.get(record["learning_outcome"])
+        if assesment_id is None or lo_id is None:
+            skipped += 1
+        else:
+            links[(assesment_id, lo_id)] = record["weight"]
+
+    _restore_weighted_links(
+        AssessmentLearningOutcome, ("assesment_id", "learning_outcome_id"), links
+    )
+    touched.update(
+        _ids_by(Course, "code", (record["course"] for record in batch)).values()
+    )
+    return len(batch) - skipped, skipped
+
+
+def _restore_enrollments(batch, touched):
+    Enrollment = User.courses.through
+    courses = _ids_by(Course, "code", (record["course"] for record in batch))
+    students = _ids_by(User, "username", (record["username"] for record in batch))
+    enrollments = []
+    for record in batch:
+        course_id = courses.get(record["course"])
+        student_id = students.get(record["username"])
+        if course_id is not None and student_id is not None:
+            enrollments.append(Enrollment(course_id=course_id, user_id=student_id))
+    Enrollment.objects.bulk_create(enrollments, ignore_conflicts=True)
+    return len(enrollments), len(batch) - len(enrollments)
+
+
+def _restore_scores(batch, touched):
+    assessments = _assessment_ids({_assessment_key(record) for record in batch})
+    students = _ids_by(User, "username", (record["username"] for record in batch))
+    scores = {}
+    skipped = 0
+    for record in batch:
+        assesment_id = assessments.get(_assessment_key(record))
+        student_id = students.get(record["username"])
+        if assesment_id is None or student_id is None:
+            skipped += 1
+        else:
+            scores[(student_id, assesment_id)] = record["score"]
+
+    upsert_scores(scores)
+    touched.update(
+        _ids_by(Course, "code", (record["course"] for record in batch)).values()
+    )
+    return len(batch) - skipped, skipped
+
+
+_RESTORERS = {
+    "program_outcome": _restore_program_outcomes,
+    "user": _restore_users,
+    "course": _restore_courses,
+    "learning_outcome": _restore_learning_outcomes,
+    "program_learning_outcome": _restore_program_links,
+    "assessment": _restore_assessments,
+    "assessment_learning_outcome": _restore_assessment_links,
+    "enrollment": _restore_enrollments,
+    "score": _restore_scores,
+}
+
+
+def restore_archive(records):
+    """
+    Loads archive records (see iter_archive) into the database in one
+    transaction, ARCHIVE_BATCH_SIZE records of a type per bulk write, so
+    memory stays flat however large the archive is.
+
+    Existing rows are matched by their natural keys and updated; users that
+    already exist are left untouched. Records that reference missing rows
+    are skipped. Attainment of the affected courses is refreshed on commit.
+
+    Returns {"restored": {type: n}, "skipped": {type: n}}.
+    """
+    restored = Counter()
+    skipped = Counter()
+    touched = set()
+
+    def flush(record_type, batch):
+        restore = _RESTORERS.get(record_type)
+        if restore is None:
+            skipped[record_type] += len(batch)
+            return
+        done, missed = restore(batch, touched)
+        restored[record_type] += done
+        skipped[record_type] += missed
+
+    with transaction.atomic():
+        record_type = None
+        batch = []
+        for record in records:
+            if record.get("type") != record_type or len(batch) >= ARCHIVE_BATCH_SIZE:
+                if batch:
+                    flush(record_type, batch)
+                record_type = record.get("type")
+                batch = []
+            batch.append(record)
+        if batch:
+            flush(record_type, batch)
+
+        # Bulk writes skip the model signals.
+        schedule_course_refresh(course_ids=touched)
+
+    return {"restored": dict(restored), "skipped": dict(+skipped)}
@@ -0,0 +1,186 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import (
+    Assesment,
+    AssessmentScoreSummary,
+    Course,
+    CourseProgramOutcomeAttainment,
+    LearningOutcome,
+    LearningOutcomeAttainment,
+    ProgramOutcome,
+    StudentAssessmentScore,
+)
+from .report_cache import bump_course_versions
+from .reports import compute_attainment
+
+_pending = threading.local()
+
+
+def apply_score_changes(changes, create_missing=True):
+    """
+    Folds score writes into the assessment score summaries.
+
+    `changes` is an iterable of (assesment_id, old_score, new_score) where
+    old_score is None for inserted rows and new_score is None for deleted rows.
+    Must be called after the scores themselves have been written. Assessments
+    without a summary yet get one built from their raw scores unless
+    `create_missing` is False.
+    """
+    deltas = {}
+    for assesment_id, old_score, new_score in changes:
+        delta = deltas.setdefault(assesment_id, [0, 0])
+        delta[0] += (new_score or 0) - (old_score or 0)
+        delta[1] += (new_score is not None) - (old_score is not None)
+
+    missing = []
+    for assesment_id, (sum_delta, count_delta) in deltas.items():
+        if not sum_delta and not count_delta:
+            continue
+        updated = AssessmentScoreSummary.objects.filter(
+            assesment_id=assesment_id
+        ).update(
+            score_sum=F("score_sum") + sum_delta,
+            score_count=F("score_count") + count_delta,
+        )
+        if not updated:
+            missing.append(assesment_id)
+
+    if missing and create_missing:
+        rebuild_score_summaries(missing)
+
+
+def rebuild_score_summaries(assessment_ids=None):
+    """
+    Recomputes the score summaries of the given assessments (all when None)
+    from the raw StudentAssessmentScore rows.
+    """
+    assessments = Assesment.objects.all()
+    scores = StudentAssessmentScore.objects.all()
+    if assessment_ids is not None:
+        assessments = assessments.filter(id__in=assessment_ids)
+        scores = scores.filter(assesment_id__in=assessment_ids)
+
+    totals = {
+        row["assesment_id"]: row
+        for row in scores.values("assesment_id")
+        .annotate(score_sum=Sum("score"), score_count=Count("id"))
+        .order_by()
+    }
+
+    AssessmentScoreSummary.objects.bulk_create(
+        [
+            AssessmentScoreSummary(
+                assesment_id=assesment_id,
+                score_sum=totals.get(assesment_id, {}).get("score_sum") or 0,
+                score_count=totals.get(assesment_id, {}).get("score_count") or 0,
+            )
+            for assesment_id in assessments.values_list("id", flat=True)
+        ],
+        update_conflicts=True,
+        unique_fields=["assesment"],
+        update_fields=["score_sum", "score_count"],
+    )
+
+
+def refresh_course_attainment(course_ids):
+    """
+    Recomputes the learning outcome and program outcome attainment rows of the
+    given courses from the score summaries and the current weights, and
+    invalidates their cached reports.
+    """
+    course_ids = list(course_ids)
+    if not course_ids:
+        return
+
+    attainment = compute_attainment(course_ids)
+    program_outcome_ids = dict(ProgramOutcome.objects.values_list("code", "id"))
+
+    learning_outcome_rows = []
+    program_outcome_rows = []
+    for course_id, report in attainment.items():
+        for lo_id, score in report["learning_outcomes"].items():
+            learning_outcome_rows.append(
+                LearningOutcomeAttainment(learning_outcome_id=lo_id, score=score)
+            )
+        for po_code, contribution in report["program_outcomes"].items():
+            program_outcome_rows.append(
+                CourseProgramOutcomeAttainment(
+                    course_id=course_id,
+                    program_outcome_id=program_outcome_ids[po_code],
+                    weighted_sum=contribution["total"],
+                    weight_sum=contribution["weight"],
+                )
+            )
+
+    with transaction.atomic():
+        LearningOutcomeAttainment.objects.bulk_create(
+            learning_outcome_rows,
+            update_conflicts=True,
+            unique_fields=["learning_outcome"],
+            update_fields=["score"],
+        )
+        CourseProgramOutcomeAttainment.objects.filter(course_id__in=course_ids).delete()
+        CourseProgramOutcomeAttainment.objects.bulk_create(program_outcome_rows)
+
+    bump_course_versions(course_ids)
+
+
+def schedule_course_refresh(course_ids=(), assessment_ids=(), learning_outcome_ids=()):
+    """
+    Queues an attainment refresh for the given courses (or the courses owning
+    the given assessments and learning outcomes) once the current transaction
+    commits.
+
+    Refreshes requested inside one transaction are collapsed into a single
+    refresh, so signal handlers can call this once per affected row.
+    """
+    if not hasattr(_pending, "course_ids"):
+        _reset_pending()
+    _pending.course_ids.update(course_ids)
+    _pending.assessment_ids.update(assessment_ids)
+    _pending.learning_outcome_ids.update(learning_outcome_ids)
+    transaction.on_commit(_flush_pending_refresh)
+
+
+def _reset_pending():
+    _pending.course_ids = set()
+    _pending.assessment_ids = set()
+    _pending.learning_outcome_ids = set()
+
+
+def _flush_pending_refresh():
+    if not hasattr(_pending, "course_ids"):
+        return
+    course_ids = _pending.course_ids
+    assessment_ids = _pending.assessment_ids
+    learning_outcome_ids = _pending.learning_outcome_ids
+    if not (course_ids or assessment_ids or learning_outcome_ids):
+        return
+    _reset_pending()
+
+    if assessment_ids:
+        course_ids |= set(
+            Assesment.objects.filter(id__in=assessment_ids).values_list(
+                "course_id", flat=True
+            )
+        )
+    if learning_outcome_ids:
+        course_ids |= set(
+            LearningOutcome.objects.filter(id__in=learning_outcome_ids).values_list(
+                "course_id", flat=True
+            )
+        )
+    course_ids.discard(None)
+    refresh_course_attainment(course_ids)
+
+
+def rebuild_attainment():
+    """
+    Rebuilds every score summary and attainment row from scratch.
+    """
+    with transaction.atomic():
+        rebuild_score_summaries()
+        refresh_course_attainment(Course.objects.values_list("id", flat=True))
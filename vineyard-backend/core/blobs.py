@@ -0,0 +1,113 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+SUFFIX_PATTERN = re.compile(r"^\.[a-z0-9]{1,10}$")
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,10})?$")
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+def _root():
+    return Path(settings.BLOB_DIR)
+
+
+def blob_path(key):
+    """
+    Returns the file path of a blob. Keys are "<sha256><suffix>", e.g.
+    "9f86...0f00a08.pdf", so the suffix survives for readers that dispatch on it.
+    """
+    if not KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid blob key: {key!r}")
+    return _root() / key[:2] / key
+
+
+def blob_digest(key):
+    """
+    Returns the SHA-256 hex digest of a blob's content.
+    """
+    return key[:64]
+
+
+def store_upload(uploaded_file, max_bytes=None):
+    """
+    Streams an uploaded file into the blob store chunk by chunk, hashing it on
+    the way, and returns its key. Identical content is stored once; storing it
+    again only renews the blob's expiry.
+
+    Raises BlobTooLarge if the file exceeds `max_bytes` (default
+    settings.BLOB_MAX_BYTES); nothing is kept in that case.
+    """
+    max_bytes = max_bytes or settings.BLOB_MAX_BYTES
+    if uploaded_file.size is not None and uploaded_file.size > max_bytes:
+        raise BlobTooLarge(f"File is larger than {max_bytes} bytes.")
+
+    suffix = Path(uploaded_file.name or "").suffix.lower()
+    if not SUFFIX_PATTERN.match(suffix):
+        suffix = ""
+
+    tmp_dir = _root() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        try:
+            for chunk in uploaded_file.chunks():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise BlobTooLarge(f"File is larger than {max_bytes} bytes.")
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+    key = digest.hexdigest() + suffix
+    path = blob_path(key)
+    path.parent.mkdir(exist_ok=True)
+    # rename is atomic, so readers never see a half-written blob, and a
+    # concurrent upload of the same content simply replaces it.
+    os.replace(tmp.name, path)
+    return key
+
+
+def _remove_older_than(paths, cutoff):
+    removed = 0
+    for path in paths:
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def cleanup_blobs(max_age=None, tmp_max_age=None):
+    """
+    Deletes blobs not stored or re-stored within `max_age` seconds (default
+    settings.BLOB_TTL), and temporary files older than `tmp_max_age` seconds
+    (default settings.BLOB_TMP_TTL). Temporary files have their own, longer
+    limit so uploads still being written are never removed.
+
+    Returns the number of files removed.
+    """
+    max_age = settings.BLOB_TTL if max_age is None else max_age
+    tmp_max_age = settings.BLOB_TMP_TTL if tmp_max_age is None else tmp_max_age
+    now = time.time()
+    root = _root()
+    if not root.exists():
+        return 0
+
+    # Blobs live in directories named after the first two digest characters.
+    removed = _remove_older_than(root.glob("[0-9a-f][0-9a-f]/*"), now - max_age)
+    removed += _remove_older_than((root / "tmp").glob("*"), now - tmp_max_age)
+    return removed
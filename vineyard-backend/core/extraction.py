@@ -0,0 +1,370 @@
+import logging
+import multiprocessing
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+import pypdfium2 as pdfium
+from django.conf import settings
+from docx import Document
+from lxml import etree
+
+from .generate_cache import cache_pages, get_cached_pages
+
+logger = logging.getLogger(__name__)
+
+# Bump when syllabus text extraction changes, so cached texts and pages are
+# re-parsed.
+TEXT_EXTRACTOR_VERSION = 3
+
+
+def _pdfium_pages(path, page_numbers):
+    """
+    Text-only extraction with PDFium. Much faster than pdfplumber since it
+    does no layout analysis, at the cost of reading table cells in content
+    stream order.
+    """
+    pdf = pdfium.PdfDocument(path)
+    try:
+        texts = []
+        for number in page_numbers:
+            page = pdf[number]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_bounded().replace("\r\n", "\n").strip())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+
+def _pdfplumber_pages(path, page_numbers):
+    with pdfplumber.open(path, pages=[number + 1 for number in page_numbers]) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+PDF_BACKENDS = {
+    "pdfium": _pdfium_pages,
+    "pdfplumber": _pdfplumber_pages,
+}
+
+
+def extract_pdf_pages(path, page_numbers, backend):
+    """
+    Returns the text of the given 0-based pages. Files PDFium cannot read are
+    retried with pdfplumber, which is more forgiving of malformed PDFs.
+    """
+    try:
+        return PDF_BACKENDS[backend](path, page_numbers)
+    except pdfium.PdfiumError:
+        if backend == "pdfplumber":
+            raise
+        logger.warning("PDFium failed on %s, falling back to pdfplumber", path)
+        return _pdfplumber_pages(path, page_numbers)
+
+
+def pdf_page_count(path):
+    try:
+        pdf = pdfium.PdfDocument(path)
+    except pdfium.PdfiumError:
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _split(items, parts):
+    size = -(-len(items) // parts)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _extract_missing(path, page_numbers, backend, workers):
+    min_pages = settings.PDF_PARALLEL_MIN_PAGES
+    # Daemonic processes (e.g. some worker pools) may not start children.
+    if (
+        workers <= 1
+        or len(page_numbers) < min_pages
+        or multiprocessing.current_process().daemon
+    ):
+        return dict(zip(page_numbers, extract_pdf_pages(path, page_numbers, backend)))
+
+    chunks = _split(page_numbers, workers)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        results = pool.map(
+            extract_pdf_pages,
+            [path] * len(chunks),
+            chunks,
+            [backend] * len(chunks),
+        )
+        return {
+            number: text
+            for chunk, texts in zip(chunks, results)
+            for number, text in zip(chunk, texts)
+        }
+
+
+def extract_pdf_text(path, digest=None, backend=None, workers=None):
+    """
+    Returns the text of a PDF, one line-separated block per non-empty page.
+
+    Pages are split across `workers` processes (default
+    settings.PDF_EXTRACT_WORKERS) when there are enough of them. When `digest`
+    is given, each page's text is cached under it, so only pages that were
+    never seen are parsed again.
+    """
+    backend = backend or settings.PDF_TEXT_BACKEND
+    workers = settings.PDF_EXTRACT_WORKERS if workers is None else workers
+
+    page_count = pdf_page_count(path)
+    pages = {}
+    if digest:
+        pages = get_cached_pages(
+            digest, TEXT_EXTRACTOR_VERSION, backend, range(page_count)
+        )
+
+    missing = [number for number in range(page_count) if number not in pages]
+    if missing:
+        extracted = _extract_missing(path, missing, backend, workers)
+        if digest:
+            cache_pages(digest, TEXT_EXTRACTOR_VERSION, backend, extracted)
+        pages.update(extracted)
+
+    return "".join(
+        pages[number] + "\n" for number in range(page_count) if pages[number]
+    )
+
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PR = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE_DOCUMENT = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+    "officeDocument"
+)
+
+# Text equivalents of run content, as python-docx renders them.
+_RUN_TEXT = {
+    W + "tab": "\t",
+    W + "ptab": "\t",
+    W + "cr": "\n",
+    W + "noBreakHyphen": "-",
+}
+# Paragraphs nested inside these are cell content or text boxes, not blocks.
+_BLOCK_PARENTS = {W + "body", W + "hdr", W + "ftr", W + "sdtContent"}
+
+
+def _run_text(run):
+    parts = []
+    for child in run:
+        if child.tag == W + "t":
+            parts.append(child.text or "")
+        elif child.tag == W + "br":
+            if child.get(W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            parts.append(_RUN_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph):
+    parts = []
+    for child in paragraph:
+        if child.tag == W + "r":
+            parts.append(_run_text(child))
+        elif child.tag == W + "hyperlink":
+            parts.extend(_run_text(run) for run in child.iterchildren(W + "r"))
+    return "".join(parts)
+
+
+def _release(element):
+    """
+    Drops a handled element and its already handled preceding siblings, so the
+    tree built by iterparse stays small however long the part is.
+    """
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _is_merge_continuation(cell):
+    properties = cell.find(W + "tcPr")
+    merge = None if properties is None else properties.find(W + "vMerge")
+    return merge is not None and merge.get(W + "val", "continue") == "continue"
+
+
+def _iter_part_text(stream, sections=None):
+    """
+    Yields the text blocks of a document, header or footer part in document
+    order: paragraphs as they are, table cells stripped and once each, with
+    cells continuing a vertical merge skipped.
+
+    The (header, footer) relationship ids of each section are appended to
+    `sections` when given.
+    """
+    cells = []
+    for event, element in etree.iterparse(
+        stream,
+        events=("start", "end"),
+        tag=(W + "p", W + "tbl", W + "tc", W + "tr", W + "sectPr"),
+        resolve_entities=False,
+    ):
+        tag = element.tag
+        if event == "start":
+            if tag == W + "tc":
+                cells.append([])
+            elif tag == W + "tbl" and cells and cells[-1]:
+                # Emit what precedes a nested table before the table itself.
+                text = "\n".join(cells[-1]).strip()
+                cells[-1] = []
+                if text:
+                    yield text
+            continue
+
+        if tag == W + "p":
+            parent = element.getparent()
+            if parent is not None and parent.tag == W + "tc":
+                cells[-1].append(_paragraph_text(element))
+                element.clear()
+            elif parent is None or parent.tag in _BLOCK_PARENTS:
+                text = _paragraph_text(element)
+                if text.strip():
+                    yield text
+                _release(element)
+        elif tag == W + "tc":
+            text = "\n".join(cells.pop()).strip()
+            if text and not _is_merge_continuation(element):
+                yield text
+            _release(element)
+        elif tag in (W + "tr", W + "tbl"):
+            _release(element)
+        elif tag == W + "sectPr" and sections is not None:
+            sections.append(
+                tuple(
+                    next(
+                        (
+                            ref.get(R + "id")
+                            for ref in element.iterchildren(W + kind)
+                            if ref.get(W + "type") == "default"
+                        ),
+                        None,
+                    )
+                    for kind in ("headerReference", "footerReference")
+                )
+            )
+
+
+def _part_targets(docx, part_name):
+    """
+    Returns {relationship id: part name} for the relationships of a part.
+    """
+    directory, name = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, "_rels", name + ".rels")
+    if rels_name not in docx.namelist():
+        return {}
+    with docx.open(rels_name) as f:
+        relationships = etree.parse(f).getroot()
+    targets = {}
+    for rel in relationships.iterchildren(PR + "Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target")
+        targets[rel.get("Id")] = (
+            target.lstrip("/")
+            if target.startswith("/")
+            else posixpath.normpath(posixpath.join(directory, target))
+        )
+    return targets
+
+
+def _main_part_name(docx):
+    with docx.open("_rels/.rels") as f:
+        relationships = etree.parse(f).getroot()
+    for rel in relationships.iterchildren(PR + "Relationship"):
+        if rel.get("Type") == OFFICE_DOCUMENT:
+            return rel.get("Target").lstrip("/")
+    raise ValueError("Not a Word document: no main document part.")
+
+
+def _stream_docx_text(file):
+    """
+    Reads the body, then each section's default header and footer, straight
+    from the XML parts without building python-docx's object model.
+
+    Unlike python-docx, merged table cells appear once, tables keep their
+    place among the paragraphs, and headers shared by sections appear once.
+    """
+    text = []
+    with zipfile.ZipFile(file) as docx:
+        main_part = _main_part_name(docx)
+        sections = []
+        with docx.open(main_part) as f:
+            text.extend(_iter_part_text(f, sections))
+
+        # Sections without their own header or footer reuse the previous one.
+        targets = _part_targets(docx, main_part)
+        header = footer = None
+        parts = []
+        for header_id, footer_id in sections:
+            header = targets.get(header_id, header)
+            footer = targets.get(footer_id, footer)
+            parts.extend(part for part in (header, footer) if part not in parts)
+
+        for part in parts:
+            if part:
+                with docx.open(part) as f:
+                    text.extend(_iter_part_text(f))
+
+    return "\n".join(text)
+
+
+def _python_docx_text(file):
+    doc = Document(file)
+    text = []
+
+    for para in doc.paragraphs:
+        if para.text.strip():
+            text.append(para.text)
+
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                cell_text = cell.text.strip()
+                if cell_text:
+                    text.append(cell_text)
+
+    for section in doc.sections:
+        header = section.header
+        footer = section.footer
+
+        for para in header.paragraphs:
+            if para.text.strip():
+                text.append(para.text)
+
+        for para in footer.paragraphs:
+            if para.text.strip():
+                text.append(para.text)
+
+    return "\n".join(text)
+
+
+DOCX_BACKENDS = {
+    "stream": _stream_docx_text,
+    "python-docx": _python_docx_text,
+}
+
+
+def extract_docx_text(file, backend=None) -> str:
+    return DOCX_BACKENDS[backend or settings.DOCX_TEXT_BACKEND](file)
+
+
+def extract_syllabus_text(path, suffix: str, digest=None) -> str:
+    if suffix == "docx":
+        return extract_docx_text(path)
+    if suffix == "pdf":
+        return extract_pdf_text(path, digest=digest)
+    return ""
@@ -0,0 +1,85 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+RESULT_KEY = "generate:result:v{version}:{file}:{program_outcomes}"
+TEXT_KEY = "generate:text:v{version}:{file}"
+PAGE_KEY = "generate:page:v{version}:{backend}:{file}:{page}"
+
+RESULT_TIMEOUT = getattr(settings, "GENERATE_CACHE_TIMEOUT", 60 * 60 * 24 * 7)
+TEXT_TIMEOUT = getattr(settings, "GENERATE_TEXT_CACHE_TIMEOUT", 60 * 60 * 24 * 30)
+MAX_TEXT_LENGTH = getattr(settings, "GENERATE_TEXT_CACHE_MAX_LENGTH", 1024 * 1024)
+
+# Entries can always be recomputed, so the cache Redis (separate from the
+# Celery broker) may evict any of them under memory pressure.
+
+
+def _result_key(digest, program_outcomes_str, prompt_version):
+    return RESULT_KEY.format(
+        version=prompt_version,
+        file=digest,
+        program_outcomes=hashlib.sha256(program_outcomes_str.encode()).hexdigest(),
+    )
+
+
+def get_cached_result(digest, program_outcomes_str, prompt_version):
+    """
+    Returns the stored LO/PO mapping for this exact file, program outcome
+    list and prompt version, or None.
+    """
+    return cache.get(_result_key(digest, program_outcomes_str, prompt_version))
+
+
+def cache_result(digest, program_outcomes_str, prompt_version, result):
+    cache.set(
+        _result_key(digest, program_outcomes_str, prompt_version),
+        result,
+        timeout=RESULT_TIMEOUT,
+    )
+
+
+def get_cached_text(digest, extractor_version):
+    """
+    Returns the text previously extracted from this file by this extractor
+    version, or None. Kept apart from the results so a prompt change does not
+    force the file to be parsed again.
+    """
+    return cache.get(TEXT_KEY.format(version=extractor_version, file=digest))
+
+
+def cache_text(digest, extractor_version, text):
+    # Very long texts would crowd out many smaller entries; parse those again.
+    if len(text) > MAX_TEXT_LENGTH:
+        return
+    cache.set(
+        TEXT_KEY.format(version=extractor_version, file=digest),
+        text,
+        timeout=TEXT_TIMEOUT,
+    )
+
+
+def get_cached_pages(digest, extractor_version, backend, page_numbers):
+    """
+    Returns {page_number: text} for the pages of this file already extracted
+    by this backend and extractor version.
+    """
+    keys = {
+        PAGE_KEY.format(
+            version=extractor_version, backend=backend, file=digest, page=number
+        ): number
+        for number in page_numbers
+    }
+    return {keys[key]: text for key, text in cache.get_many(keys).items()}
+
+
+def cache_pages(digest, extractor_version, backend, pages):
+    cache.set_many(
+        {
+            PAGE_KEY.format(
+                version=extractor_version, backend=backend, file=digest, page=number
+            ): text
+            for number, text in pages.items()
+        },
+        timeout=TEXT_TIMEOUT,
+    )
@@ -0,0 +1,560 @@
+import csv
+import json
+from collections import Counter
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from openpyxl import load_workbook
+
+from .attainment import refresh_course_attainment
+from .models import Course, LearningOutcome, ProgramOutcome, User
+from .scores import parse_score, upsert_scores
+from .serializers import (
+    DEFAULT_PASSWORD,
+    EMAIL_TAKEN,
+    USERNAME_TAKEN,
+    CourseCreateSerializer,
+    StudentCreateSerializer,
+    TeacherCreateSerializer,
+    create_courses,
+)
+
+SPREADSHEET_TYPES = (".xlsx", ".csv")
+IMPORT_BATCH_SIZE = 1000
+CURRICULUM_BATCH_SIZE = 100
+
+
+def iter_spreadsheet_rows(path):
+    """
+    Yields the rows of an XLSX or CSV file as tuples without loading the whole
+    file: XLSX is read in openpyxl's read-only mode, CSV line by line.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == ".xlsx":
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif suffix == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.reader(f)
+    else:
+        raise ValueError("Unsupported file type")
+
+
+def spreadsheet_row_count(path):
+    """
+    Returns the number of data rows when it is known up front (XLSX
+    dimensions), otherwise None.
+    """
+    if Path(path).suffix.lower() != ".xlsx":
+        return None
+    workbook = load_workbook(path, read_only=True)
+    try:
+        max_row = workbook.active.max_row
+    finally:
+        workbook.close()
+    return max_row - 1 if max_row else None
+
+
+def _cell_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value).strip()
+
+
+def map_grade_columns(course, header):
+    """
+    Maps spreadsheet header cells to the course's assessments.
+
+    A column matches an assessment by its report label ("Midterm 1",
+    "Final 1"), by its bare type name when the course has only one assessment
+    of that type ("Final"), or by its id.
+
+    Returns (username_column, {column: assesment_id}, unmapped_headers).
+    """
+    labels = {}
+    type_counts = {}
+    for assesment in course.assesments.order_by("id"):
+        display = assesment.get_name_display().lower()
+        type_counts[display] = type_counts.get(display, 0) + 1
+        labels[f"{display} {type_counts[display]}"] = assesment.id
+        labels[str(assesment.id)] = assesment.id
+    for display, count in type_counts.items():
+        if count == 1:
+            labels[display] = labels[f"{display} 1"]
+
+    header = [_cell_text(cell).lower() for cell in header]
+    username_column = header.index("username") if "username" in header else 0
+
+    columns = {}
+    unmapped = []
+    for i, label in enumerate(header):
+        if i == username_column or not label:
+            continue
+        if label in labels:
+            columns[i] = labels[label]
+        else:
+            unmapped.append(label)
+    return username_column, columns, unmapped
+
+
+def _save_grade_batch(batch, errors):
+    students = User.objects.filter(
+        username__in=[username for _, username, _ in batch], role="student"
+    ).in_bulk(field_name="username")
+
+    scores = {}
+    for row_number, username, row_scores in batch:
+        student = students.get(username)
+        if not student:
+            errors.append(f"row {row_number}: {username}: student not found")
+            continue
+        for assesment_id, score in row_scores.items():
+            scores[(student.id, assesment_id)] = score
+
+    with transaction.atomic():
+        upsert_scores(scores)
+    return len(scores)
+
+
+def import_course_grades(course, rows, progress=None):
+    """
+    Imports a grade sheet for `course` from an iterable of rows whose first row
+    is the header, writing one bulk upsert per IMPORT_BATCH_SIZE rows.
+
+    `progress(processed, saved, error_count)` is called after every batch.
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return {"processed": 0, "saved": 0, "errors": ["empty file"]}
+
+    username_column, columns, unmapped = map_grade_columns(course, header)
+
+    processed = 0
+    saved = 0
+    errors = []
+    batch = []
+
+    # Batches commit on their own, so attainment is refreshed even when a
+    # later batch fails.
+    try:
+        for row_number, row in enumerate(rows, start=2):
+            if not any(_cell_text(cell) for cell in row):
+                continue
+            processed += 1
+
+            username = (
+                _cell_text(row[username_column]) if username_column < len(row) else ""
+            )
+            if not username:
+                errors.append(f"row {row_number}: missing username")
+                continue
+
+            row_scores = {}
+            for column, assesment_id in columns.items():
+                value = row[column] if column < len(row) else None
+                if _cell_text(value) == "":
+                    continue
+                try:
+                    row_scores[assesment_id] = parse_score(value)
+                except (TypeError, ValueError):
+                    errors.append(
+                        f"row {row_number}: {username}: invalid score {value!r}"
+                    )
+            batch.append((row_number, username, row_scores))
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                saved += _save_grade_batch(batch, errors)
+                batch = []
+                if progress:
+                    progress(processed, saved, len(errors))
+
+        if batch:
+            saved += _save_grade_batch(batch, errors)
+        if progress:
+            progress(processed, saved, len(errors))
+    finally:
+        refresh_course_attainment([course.id])
+
+    return {
+        "processed": processed,
+        "saved": saved,
+        "errors": errors,
+        "unmapped_columns": unmapped,
+    }
+
+
+def iter_csv_dicts(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+USER_SERIALIZERS = {
+    "teacher": TeacherCreateSerializer,
+    "student": StudentCreateSerializer,
+}
+
+
+def _create_user_batch(serializer, batch, password, errors):
+    items, item_errors = serializer.check_batch([row for _, row in batch])
+
+    users = []
+    for (row_number, row), item, field_errors in zip(batch, items, item_errors):
+        if field_errors:
+            errors.append(
+                {
+                    "row": row_number,
+                    "username": row["username"],
+                    "error": " ".join(
+                        str(message)
+                        for messages in field_errors.values()
+                        for message in messages
+                    ),
+                }
+            )
+        else:
+            users.append((row_number, serializer.child.build_user(item, password)))
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in users])
+        return len(users)
+    except IntegrityError:
+        pass
+
+    # Another request created some of these users in the meantime; fall back
+    # to one savepoint per row so the rest of the batch still goes in.
+    created = 0
+    for row_number, user in users:
+        try:
+            with transaction.atomic():
+                user.pk = None
+                user.save()
+            created += 1
+        except IntegrityError:
+            errors.append(
+                {
+                    "row": row_number,
+                    "username": user.username,
+                    "error": (
+                        USERNAME_TAKEN
+                        if User.objects.filter(username=user.username).exists()
+                        else EMAIL_TAKEN
+                    ),
+                }
+            )
+    return created
+
+
+def import_users(rows, role, progress=None):
+    """
+    Creates users with `role` from an iterable of {"username", "email"} dicts
+    (e.g. a csv.DictReader).
+
+    Rows are validated in IMPORT_BATCH_SIZE batches by the role's create
+    serializer in many=True mode (see UserListSerializer), so uniqueness costs
+    two queries per batch. The default password is hashed once and shared by
+    every row, and users are inserted with bulk_create. Invalid rows are
+    skipped and reported.
+
+    Returns {"created": n, "errors": [{"row", "username", "error"}]}.
+    """
+    serializer = USER_SERIALIZERS[role](many=True)
+    password = make_password(DEFAULT_PASSWORD)
+    seen_usernames = set()
+    seen_emails = set()
+    created = 0
+    errors = []
+    batch = []
+
+    for row_number, row in enumerate(rows, start=2):
+        username = (row.get("username") or "").strip()
+        email = (row.get("email") or "").strip()
+
+        # Later copies of a row are reported; the list serializer would
+        # reject every copy within a batch and none across batches.
+        error = None
+        if username and username in seen_usernames:
+            error = "Duplicate username in file."
+        elif email and email in seen_emails:
+            error = "Duplicate email in file."
+        if error:
+            errors.append({"row": row_number, "username": username, "error": error})
+            continue
+
+        seen_usernames.add(username)
+        seen_emails.add(email)
+        batch.append((row_number, {"username": username, "email": email}))
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            created += _create_user_batch(serializer, batch, password, errors)
+            batch = []
+            if progress:
+                progress(row_number - 1, created, len(errors))
+
+    if batch:
+        created += _create_user_batch(serializer, batch, password, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "errors": errors}
+
+
+def iter_enrollment_rows(path):
+    """
+    Yields (line_number, {"username", "course_code"}) pairs from a CSV file or
+    an NDJSON file (one JSON object per line).
+    """
+    if Path(path).suffix.lower() in (".ndjson", ".jsonl"):
+        yield from _iter_ndjson(path)
+    else:
+        yield from enumerate(iter_csv_dicts(path), start=2)
+
+
+def _iter_ndjson(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {}
+
+
+def _save_enrollment_batch(batch, course_ids, errors):
+    Enrollment = User.courses.through
+    students = dict(
+        User.objects.filter(
+            username__in={username for _, username, _ in batch}, role="student"
+        ).values_list("username", "id")
+    )
+
+    enrollments = {}
+    for row_number, username, course_code in batch:
+        if username not in students:
+            errors.append(
+                {"row": row_number, "username": username, "error": "Student not found."}
+            )
+        elif course_code not in course_ids:
+            errors.append(
+                {
+                    "row": row_number,
+                    "username": username,
+                    "error": f"Course {course_code} not found.",
+                }
+            )
+        else:
+            enrollments[(students[username], course_ids[course_code])] = Enrollment(
+                user_id=students[username], course_id=course_ids[course_code]
+            )
+
+    Enrollment.objects.bulk_create(enrollments.values(), ignore_conflicts=True)
+    return len(enrollments)
+
+
+def import_enrollments(rows, progress=None):
+    """
+    Enrolls students into courses from an iterable of
+    (line_number, {"username", "course_code"}) pairs, writing straight into the
+    User.courses through table with one insert per IMPORT_BATCH_SIZE rows.
+    Existing enrollments are left untouched.
+
+    Returns {"enrolled": n, "errors": [{"row", "username", "error"}]}.
+    """
+    course_ids = dict(Course.objects.values_list("code", "id"))
+    processed = 0
+    enrolled = 0
+    errors = []
+    batch = []
+
+    for row_number, row in rows:
+        processed += 1
+        username = _cell_text(row.get("username"))
+        course_code = _cell_text(row.get("course_code"))
+        if not username or not course_code:
+            errors.append(
+                {
+                    "row": row_number,
+                    "username": username,
+                    "error": "Missing username or course_code.",
+                }
+            )
+            continue
+        batch.append((row_number, username, course_code))
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            enrolled += _save_enrollment_batch(batch, course_ids, errors)
+            batch = []
+            if progress:
+                progress(processed, enrolled, len(errors))
+
+    if batch:
+        enrolled += _save_enrollment_batch(batch, course_ids, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"enrolled": enrolled, "errors": errors}
+
+
+def iter_curriculum(path):
+    """
+    Yields (number, course) pairs from an NDJSON file (one course per line,
+    numbered by line) or a JSON file holding a list of courses or
+    {"courses": [...]} (numbered from 1). Courses use the CourseCreateSerializer
+    payload.
+    """
+    if Path(path).suffix.lower() in (".ndjson", ".jsonl"):
+        yield from _iter_ndjson(path)
+        return
+
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON file: {e}")
+    if isinstance(data, dict):
+        data = data.get("courses", [])
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of courses")
+    for number, course in enumerate(data, start=1):
+        yield number, course if isinstance(course, dict) else {}
+
+
+def _check_curriculum_conflicts(courses):
+    """
+    Fails the courses that clash with each other or with the database, using
+    one query per kind of check for the whole file.
+    """
+    code_counts = Counter(data["code"] for _, data in courses)
+    name_counts = Counter(data["name"] for _, data in courses)
+    lo_code_counts = Counter(
+        lo_data["code"]
+        for _, data in courses
+        for lo_data in data.get("learning_outcomes", [])
+    )
+
+    taken_codes = set(
+        Course.objects.filter(code__in=code_counts).values_list("code", flat=True)
+    )
+    taken_names = set(
+        Course.objects.filter(name__in=name_counts).values_list("name", flat=True)
+    )
+    taken_lo_codes = set(
+        LearningOutcome.objects.filter(code__in=lo_code_counts).values_list(
+            "code", flat=True
+        )
+    )
+    program_outcome_codes = set(ProgramOutcome.objects.values_list("code", flat=True))
+
+    for result, data in courses:
+        errors = {}
+        if data["code"] in taken_codes:
+            errors["course_code"] = ["Course code already exists."]
+        elif code_counts[data["code"]] > 1:
+            errors["course_code"] = ["Course code appears more than once."]
+        if data["name"] in taken_names:
+            errors["course_name"] = ["Course name already exists."]
+        elif name_counts[data["name"]] > 1:
+            errors["course_name"] = ["Course name appears more than once."]
+
+        lo_errors = []
+        lo_codes = set()
+        for lo_data in data.get("learning_outcomes", []):
+            lo_codes.add(lo_data["code"])
+            if lo_data["code"] in taken_lo_codes:
+                lo_errors.append(f"{lo_data['code']}: code already exists.")
+            elif lo_code_counts[lo_data["code"]] > 1:
+                lo_errors.append(f"{lo_data['code']}: code appears more than once.")
+            for po_data in lo_data.get("programlearningoutcome_set", []):
+                po_code = po_data["program_outcome"]["code"]
+                if po_code not in program_outcome_codes:
+                    lo_errors.append(
+                        f"{lo_data['code']}: unknown program outcome {po_code}."
+                    )
+        if lo_errors:
+            errors["learning_outcomes"] = lo_errors
+
+        assessment_errors = [
+            f"{a_data['assessment_type']}: unknown learning outcome "
+            f"{lo_info['learning_outcome']['code']}."
+            for a_data in data.get("assessments", [])
+            for lo_info in a_data["learning_outcomes"]
+            if lo_info["learning_outcome"]["code"] not in lo_codes
+        ]
+        if assessment_errors:
+            errors["assessments"] = assessment_errors
+
+        if errors:
+            result.update(status="failed", errors=errors)
+
+
+def _save_curriculum_batch(batch, user):
+    try:
+        with transaction.atomic():
+            create_courses([data for _, data in batch], user)
+        return
+    except IntegrityError:
+        pass
+
+    # Something was created concurrently; retry course by course so only the
+    # clashing ones fail.
+    for result, data in batch:
+        try:
+            with transaction.atomic():
+                create_courses([data], user)
+        except IntegrityError:
+            result.update(
+                status="failed",
+                errors={"non_field_errors": ["Course or outcome code already exists."]},
+            )
+
+
+def import_curriculum(courses, user=None, progress=None):
+    """
+    Creates courses with their learning outcomes, program outcome mappings and
+    assessments from an iterable of (number, course) pairs (see
+    iter_curriculum).
+
+    Every course is validated before anything is written: payloads with
+    CourseCreateSerializer, uniqueness of course codes, names and learning
+    outcome codes with set-based queries over the whole file. Valid courses
+    are then inserted in bulk, CURRICULUM_BATCH_SIZE per savepoint, inside one
+    transaction. Invalid courses are skipped and reported.
+
+    Returns {
+        "created": n,
+        "failed": n,
+        "courses": [{"row", "code", "status": "created" | "failed", "errors"}]
+    }
+    """
+    results = []
+    valid = []
+    for number, course in courses:
+        serializer = CourseCreateSerializer(data=course)
+        result = {
+            "row": number,
+            "code": _cell_text(course.get("course_code")),
+            "status": "created",
+            "errors": {},
+        }
+        if serializer.is_valid():
+            valid.append((result, serializer.validated_data))
+        else:
+            result.update(status="failed", errors=serializer.errors)
+        results.append(result)
+
+    _check_curriculum_conflicts(valid)
+    valid = [(result, data) for result, data in valid if result["status"] == "created"]
+
+    with transaction.atomic():
+        for start in range(0, len(valid), CURRICULUM_BATCH_SIZE):
+            _save_curriculum_batch(valid[start : start + CURRICULUM_BATCH_SIZE], user)
+            if progress:
+                progress(min(start + CURRICULUM_BATCH_SIZE, len(valid)), len(valid))
+
+    created = sum(result["status"] == "created" for result in results)
+    return {"created": created, "failed": len(results) - created, "courses": results}
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pypdfium2 as pdfium
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.extraction import extract_pdf_text, pdf_page_count
+
+DATA_DIR = settings.BASE_DIR.parent / "data"
+
+
+def _padded_copy(path, pages):
+    """
+    Writes a temporary PDF repeating the pages of `path` until it has at least
+    `pages` pages, to stand in for a long syllabus. Returns its path.
+    """
+    try:
+        source = pdfium.PdfDocument(path)
+    except pdfium.PdfiumError as e:
+        raise CommandError(f"Cannot open {path}: {e}")
+    padded = pdfium.PdfDocument.new()
+    try:
+        if not len(source):
+            raise CommandError(f"{path} has no pages to repeat.")
+        while len(padded) < pages:
+            padded.import_pages(source)
+        fd, name = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            padded.save(f)
+    finally:
+        padded.close()
+        source.close()
+    return name
+
+
+def _best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "Times syllabus PDF text extraction with pdfplumber, PDFium, and PDFium "
+        "across a process pool. Defaults to the PDFs in the data/ directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="PDF files to extract")
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=0,
+            help="Repeat each file's pages until it has at least this many",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.PDF_EXTRACT_WORKERS,
+            help="Processes for the parallel run",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        paths = [Path(p) for p in options["paths"]] or sorted(DATA_DIR.glob("*.pdf"))
+        if not paths:
+            raise CommandError(f"No PDF files given and none found in {DATA_DIR}.")
+
+        workers = options["workers"]
+        repeat = options["repeat"]
+        # (label, backend, workers, use the page cache)
+        runs = [("pdfplumber", "pdfplumber", 1, False)]
+        if workers > 1:
+            runs.append((f"pdfplumber x{workers}", "pdfplumber", workers, False))
+        runs.append(("pdfium", "pdfium", 1, False))
+        if workers > 1:
+            runs.append((f"pdfium x{workers}", "pdfium", workers, False))
+        runs.append(("pdfium cached", "pdfium", 1, True))
+        self.stdout.write(
+            f"{'file':40} {'pages':>5} "
+            + " ".join(f"{label:>14}" for label, *_ in runs)
+        )
+
+        totals = [0.0] * len(runs)
+        for path in paths:
+            padded = _padded_copy(path, options["pages"]) if options["pages"] else None
+            target = padded or str(path)
+            try:
+                page_count = pdf_page_count(target)
+                digest = hashlib.sha256(Path(target).read_bytes()).hexdigest()
+                times = []
+                for _, backend, run_workers, cached in runs:
+                    if cached:
+                        # Warm the page cache first.
+                        extract_pdf_text(target, digest=digest, backend=backend)
+
+                    def run():
+                        extract_pdf_text(
+                            target,
+                            digest=digest if cached else None,
+                            backend=backend,
+                            workers=run_workers,
+                        )
+
+                    times.append(_best_time(run, repeat))
+            finally:
+                if padded:
+                    os.unlink(padded)
+
+            totals = [total + t for total, t in zip(totals, times)]
+            self.stdout.write(
+                f"{path.name[:40]:40} {page_count:>5} "
+                + " ".join(f"{t * 1000:>12.1f}ms" for t in times)
+            )
+
+        baseline = totals[0]
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Speedup over pdfplumber: "
+                + ", ".join(
+                    f"{label} {baseline / total:.1f}x"
+                    for (label, *_), total in zip(runs[1:], totals[1:])
+                )
+            )
+        )
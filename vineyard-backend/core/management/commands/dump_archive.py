@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import dump_archive, open_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams courses, outcomes, mappings, enrollments and scores to an NDJSON "
+        "archive keyed by natural keys. Paths ending in .gz are gzip-compressed; "
+        "use '-' for stdout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archive file to write, or '-' for stdout")
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            default=None,
+            help="Compress the archive regardless of the file name",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            out = open_archive(path, "w", compress=options["gzip"])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            counts = dump_archive(out)
+        finally:
+            if path != "-" or options["gzip"]:
+                out.close()
+
+        if path != "-":
+            self.stdout.write(
+                self.style.SUCCESS(
+                    ", ".join(f"{count} {name}" for name, count in counts.items())
+                )
+            )
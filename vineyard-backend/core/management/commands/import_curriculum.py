@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import import_curriculum, iter_curriculum
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates courses with their learning outcomes, program outcome mappings "
+        "and assessments from a JSON or NDJSON curriculum file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON or NDJSON curriculum file")
+        parser.add_argument(
+            "--user", help="Username recorded as the creator of the courses"
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found.")
+
+        try:
+            result = import_curriculum(iter_curriculum(options["path"]), user)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for course in result["courses"]:
+            if course["status"] == "failed":
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Row {course['row']} ({course['code'] or '?'}): "
+                        f"{json.dumps(course['errors'])}"
+                    )
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['created']} courses created, {result['failed']} failed."
+            )
+        )
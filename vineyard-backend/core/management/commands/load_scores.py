@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.scores import copy_load_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-loads scores from a CSV file (username,assessment_id,score) with "
+        "PostgreSQL COPY. Use '-' to read from stdin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to load, or '-' for stdin")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            if path == "-":
+                result = copy_load_scores(sys.stdin)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    result = copy_load_scores(f)
+        except (OSError, NotImplementedError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{result['saved']} of {result['rows']} rows merged.")
+        )
+        for key in ("unknown_students", "unknown_assessments", "invalid_scores"):
+            if result[key]["count"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{result[key]['count']} {key.replace('_', ' ')}: "
+                        + ", ".join(str(v) for v in result[key]["sample"])
+                    )
+                )
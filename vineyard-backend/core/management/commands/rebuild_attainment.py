@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.attainment import rebuild_attainment
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the assessment score summaries and the learning/program "
+        "outcome attainment tables from the raw scores and weights."
+    )
+
+    def handle(self, *args, **options):
+        rebuild_attainment()
+        self.stdout.write(self.style.SUCCESS("Attainment tables rebuilt."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import iter_archive, open_archive, restore_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads an NDJSON archive written by dump_archive (plain or gzip) in one "
+        "transaction. Use '-' to read from stdin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archive file to load, or '-' for stdin")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            stream = open_archive(path)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            result = restore_archive(iter_archive(stream))
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if path != "-":
+                stream.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                ", ".join(
+                    f"{count} {name}" for name, count in result["restored"].items()
+                )
+            )
+        )
+        for name, count in result["skipped"].items():
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{count} {name} records skipped (missing references)."
+                )
+            )
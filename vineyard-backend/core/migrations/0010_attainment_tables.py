@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_studentassessmentscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentScoreSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_count', models.IntegerField(default=0)),
+                ('assesment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='score_summary', to='core.assesment')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LearningOutcomeAttainment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('learning_outcome', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='attainment', to='core.learningoutcome')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseProgramOutcomeAttainment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weighted_sum', models.FloatField(default=0)),
+                ('weight_sum', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='program_outcome_attainments', to='core.course')),
+                ('program_outcome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.programoutcome')),
+            ],
+            options={
+                'unique_together': {('course', 'program_outcome')},
+            },
+        ),
+    ]
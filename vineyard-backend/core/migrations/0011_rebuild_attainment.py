@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def rebuild_attainment(apps, schema_editor):
+    """
+    Fills the tables added in 0010 from the existing scores and weights.
+
+    This repeats the arithmetic of core.attainment.rebuild_attainment on the
+    historical models, so later changes to core.models cannot break it.
+    """
+    Assesment = apps.get_model("core", "Assesment")
+    AssessmentLearningOutcome = apps.get_model("core", "AssessmentLearningOutcome")
+    AssessmentScoreSummary = apps.get_model("core", "AssessmentScoreSummary")
+    CourseProgramOutcomeAttainment = apps.get_model(
+        "core", "CourseProgramOutcomeAttainment"
+    )
+    LearningOutcome = apps.get_model("core", "LearningOutcome")
+    LearningOutcomeAttainment = apps.get_model("core", "LearningOutcomeAttainment")
+    ProgramLearningOutcome = apps.get_model("core", "ProgramLearningOutcome")
+    StudentAssessmentScore = apps.get_model("core", "StudentAssessmentScore")
+
+    # Fresh databases have nothing to rebuild.
+    if not Assesment.objects.exists():
+        return
+
+    totals = {
+        row["assesment_id"]: (row["score_sum"] or 0, row["score_count"])
+        for row in StudentAssessmentScore.objects.values("assesment_id")
+        .annotate(score_sum=Sum("score"), score_count=Count("id"))
+        .order_by()
+    }
+    assessment_courses = {}
+    averages = {}
+    summaries = []
+    for assesment_id, course_id in Assesment.objects.values_list("id", "course_id"):
+        score_sum, score_count = totals.get(assesment_id, (0, 0))
+        assessment_courses[assesment_id] = course_id
+        averages[assesment_id] = score_sum / score_count if score_count else 0
+        summaries.append(
+            AssessmentScoreSummary(
+                assesment_id=assesment_id,
+                score_sum=score_sum,
+                score_count=score_count,
+            )
+        )
+    AssessmentScoreSummary.objects.all().delete()
+    AssessmentScoreSummary.objects.bulk_create(summaries)
+
+    # LO score: the weighted average of its assessments' averages, counting
+    # only links to assessments of the LO's own course.
+    learning_outcome_courses = dict(
+        LearningOutcome.objects.exclude(course=None).values_list("id", "course_id")
+    )
+    lo_totals = defaultdict(float)
+    lo_weights = defaultdict(int)
+    for assesment_id, lo_id, weight in AssessmentLearningOutcome.objects.values_list(
+        "assesment_id", "learning_outcome_id", "weight"
+    ):
+        course_id = learning_outcome_courses.get(lo_id)
+        if weight and course_id and assessment_courses.get(assesment_id) == course_id:
+            lo_totals[lo_id] += weight * averages[assesment_id]
+            lo_weights[lo_id] += weight
+    lo_scores = {
+        lo_id: lo_totals[lo_id] / lo_weights[lo_id] if lo_weights[lo_id] else 0
+        for lo_id in learning_outcome_courses
+    }
+    LearningOutcomeAttainment.objects.all().delete()
+    LearningOutcomeAttainment.objects.bulk_create(
+        [
+            LearningOutcomeAttainment(learning_outcome_id=lo_id, score=score)
+            for lo_id, score in lo_scores.items()
+        ]
+    )
+
+    # Course PO contribution: LO scores weighted by the LO → PO links.
+    contributions = defaultdict(lambda: [0.0, 0])
+    for lo_id, po_id, weight in ProgramLearningOutcome.objects.values_list(
+        "learning_outcome_id", "program_outcome_id", "weight"
+    ):
+        if weight and lo_id in lo_scores:
+            contribution = contributions[(learning_outcome_courses[lo_id], po_id)]
+            contribution[0] += weight * lo_scores[lo_id]
+            contribution[1] += weight
+    CourseProgramOutcomeAttainment.objects.all().delete()
+    CourseProgramOutcomeAttainment.objects.bulk_create(
+        [
+            CourseProgramOutcomeAttainment(
+                course_id=course_id,
+                program_outcome_id=po_id,
+                weighted_sum=weighted_sum,
+                weight_sum=weight_sum,
+            )
+            for (course_id, po_id), (weighted_sum, weight_sum) in contributions.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_attainment_tables"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_attainment, migrations.RunPython.noop),
+    ]
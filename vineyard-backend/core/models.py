@@ -130,3 +130,49 @@ class StudentAssessmentScore(models.Model):
 
     def __str__(self):
         return f"{self.student.username} - {self.assesment.name}: {self.score}"
+
+
+class AssessmentScoreSummary(models.Model):
+    assesment = models.OneToOneField(
+        Assesment,
+        on_delete=models.CASCADE,
+        related_name="score_summary",
+    )
+    score_sum = models.FloatField(default=0)
+    score_count = models.IntegerField(default=0)
+
+    @property
+    def average(self):
+        return self.score_sum / self.score_count if self.score_count else 0
+
+    def __str__(self):
+        return f"{self.assesment_id}: {self.score_sum} / {self.score_count}"
+
+
+class LearningOutcomeAttainment(models.Model):
+    learning_outcome = models.OneToOneField(
+        LearningOutcome,
+        on_delete=models.CASCADE,
+        related_name="attainment",
+    )
+    score = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.learning_outcome_id}: {self.score}"
+
+
+class CourseProgramOutcomeAttainment(models.Model):
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name="program_outcome_attainments",
+    )
+    program_outcome = models.ForeignKey(ProgramOutcome, on_delete=models.CASCADE)
+    weighted_sum = models.FloatField(default=0)
+    weight_sum = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("course", "program_outcome")
+
+    def __str__(self):
+        return f"{self.course_id} - {self.program_outcome_id}: {self.weighted_sum} / {self.weight_sum}"
@@ -0,0 +1,135 @@
+import secrets
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+
+from .reports import calculate_course_report, calculate_department_report
+
+GLOBAL_VERSION_KEY = "reports:version:global"
+DEPARTMENT_VERSION_KEY = "reports:version:department"
+COURSE_VERSION_KEY = "reports:version:course:{}"
+
+REPORT_TIMEOUT = getattr(settings, "REPORT_CACHE_TIMEOUT", 60 * 60 * 24)
+LOCK_TIMEOUT = getattr(settings, "REPORT_CACHE_LOCK_TIMEOUT", 30)
+LOCK_POLL_INTERVAL = 0.05
+
+# Deletes KEYS[1] only while it still holds the caller's token.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _versions(*keys):
+    """
+    Returns the current value of each version key. Missing keys (never set or
+    evicted) start from the current time in nanoseconds, so a recreated version
+    can never collide with one used before the eviction.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_course_versions(course_ids):
+    """
+    Invalidates the cached reports of the given courses and the department
+    rollup once the current transaction commits.
+    """
+    keys = [COURSE_VERSION_KEY.format(course_id) for course_id in set(course_ids)]
+    transaction.on_commit(partial(_bump, keys + [DEPARTMENT_VERSION_KEY]))
+
+
+def bump_global_version():
+    """
+    Invalidates every cached report once the current transaction commits.
+    """
+    transaction.on_commit(partial(_bump, [GLOBAL_VERSION_KEY]))
+
+
+def _release_lock(lock_key, token):
+    """
+    Deletes a lock only if it still holds `token`. A caller that overran
+    LOCK_TIMEOUT must not delete the lock another caller has taken since.
+    On Redis this is one atomic script; other backends compare and delete in
+    two steps.
+    """
+    backend = caches["default"]
+    if isinstance(backend, RedisCache):
+        full_key = backend.make_and_validate_key(lock_key)
+        client = backend._cache.get_client(full_key, write=True)
+        client.eval(RELEASE_LOCK_SCRIPT, 1, full_key, token)
+    elif cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def get_or_compute(key, compute, timeout=REPORT_TIMEOUT):
+    """
+    Returns the cached value for `key`, computing and storing it on a miss.
+
+    Only one caller recomputes a given key at a time: the others wait for the
+    lock holder to store the value instead of recomputing it themselves, and
+    fall back to computing it only if the lock is not released in time.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    # An int, which Django's Redis serializer stores as plain digits the
+    # release script can compare.
+    token = secrets.randbits(62)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while not cache.add(lock_key, token, timeout=LOCK_TIMEOUT):
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() > deadline:
+            return compute()
+
+    try:
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, timeout)
+    finally:
+        _release_lock(lock_key, token)
+    return value
+
+
+def get_course_report(course):
+    global_version, course_version = _versions(
+        GLOBAL_VERSION_KEY, COURSE_VERSION_KEY.format(course.id)
+    )
+    return get_or_compute(
+        f"reports:course:{course.id}:{global_version}:{course_version}",
+        partial(calculate_course_report, course),
+    )
+
+
+def get_department_report():
+    global_version, department_version = _versions(
+        GLOBAL_VERSION_KEY, DEPARTMENT_VERSION_KEY
+    )
+    return get_or_compute(
+        f"reports:department:{global_version}:{department_version}",
+        calculate_department_report,
+    )
@@ -1,13 +1,339 @@
-from django.db.models import Avg
+from collections import defaultdict
+
+import numpy as np
 
 from .models import (
+    Assesment,
     AssessmentLearningOutcome,
     Course,
+    CourseProgramOutcomeAttainment,
+    LearningOutcome,
+    LearningOutcomeAttainment,
     ProgramLearningOutcome,
     ProgramOutcome,
-    StudentAssessmentScore,
 )
 
+ASSESMENT_LABELS = dict(Assesment.ASSESMENT_TYPES)
+
+
+def _empty_report():
+    return {"assessments": {}, "learning_outcomes": {}, "program_outcomes": {}}
+
+
+def _scoped(queryset, lookup, course_ids):
+    if course_ids is None:
+        return queryset
+    return queryset.filter(**{f"{lookup}__in": course_ids})
+
+
+class AttainmentModel:
+    """
+    The assessment → LO → PO chain of a set of courses as two sparse weight
+    matrices, stored in coordinate form:
+
+    - ALO: (assessment, learning outcome, weight) from AssessmentLearningOutcome
+    - PLO: (learning outcome, program outcome, weight) from ProgramLearningOutcome
+
+    LO scores are the row-normalized ALO matrix applied to the vector of
+    assessment averages, and course PO contributions are the PLO matrix applied
+    to the LO scores, summed per course. Everything is computed with NumPy in
+    one pass for all courses, so hypothetical weights or averages can be
+    evaluated in memory via `with_changes`.
+    """
+
+    def __init__(
+        self,
+        course_ids,
+        assessments,
+        learning_outcomes,
+        assessment_weights,
+        program_outcome_weights,
+    ):
+        # assessments: [(id, course_id, name, average)]
+        # learning_outcomes: [(id, code, course_id)]
+        # assessment_weights: {(assesment_id, learning_outcome_id): weight}
+        # program_outcome_weights: {(learning_outcome_id, program_outcome_code): weight}
+        self.course_ids = list(course_ids)
+        self.assessments = list(assessments)
+        self.learning_outcomes = list(learning_outcomes)
+        self.assessment_weights = dict(assessment_weights)
+        self.program_outcome_weights = dict(program_outcome_weights)
+
+        course_index = {course_id: i for i, course_id in enumerate(self.course_ids)}
+        self.assessment_index = {a[0]: i for i, a in enumerate(self.assessments)}
+        self.learning_outcome_index = {
+            lo[0]: i for i, lo in enumerate(self.learning_outcomes)
+        }
+        self.program_outcome_codes = sorted(
+            {po_code for _, po_code in self.program_outcome_weights}
+        )
+        program_outcome_index = {
+            code: i for i, code in enumerate(self.program_outcome_codes)
+        }
+
+        self.averages = np.array([a[3] for a in self.assessments], dtype=float)
+        self.assessment_course = np.array(
+            [course_index[a[1]] for a in self.assessments], dtype=np.intp
+        )
+        self.learning_outcome_course = np.array(
+            [course_index[lo[2]] for lo in self.learning_outcomes], dtype=np.intp
+        )
+
+        # Links between an assessment and an LO of another course are ignored.
+        alo = [
+            (self.assessment_index[a_id], self.learning_outcome_index[lo_id], weight)
+            for (a_id, lo_id), weight in self.assessment_weights.items()
+            if weight
+            and a_id in self.assessment_index
+            and lo_id in self.learning_outcome_index
+            and self.assessments[self.assessment_index[a_id]][1]
+            == self.learning_outcomes[self.learning_outcome_index[lo_id]][2]
+        ]
+        plo = [
+            (self.learning_outcome_index[lo_id], program_outcome_index[po_code], weight)
+            for (lo_id, po_code), weight in self.program_outcome_weights.items()
+            if weight and lo_id in self.learning_outcome_index
+        ]
+        self.alo_rows, self.alo_cols, self.alo_weights = _coordinates(alo)
+        self.plo_rows, self.plo_cols, self.plo_weights = _coordinates(plo)
+
+    @classmethod
+    def load(cls, course_ids=None):
+        """
+        Builds the model from the score summaries and link tables with four
+        queries, whatever the number of courses.
+        """
+        if course_ids is not None:
+            course_ids = list(course_ids)
+
+        assessments = [
+            (a_id, course_id, name, score_sum / score_count if score_count else 0)
+            for a_id, course_id, name, score_sum, score_count in (
+                _scoped(Assesment.objects, "course_id", course_ids)
+                .order_by("id")
+                .values_list(
+                    "id",
+                    "course_id",
+                    "name",
+                    "score_summary__score_sum",
+                    "score_summary__score_count",
+                )
+            )
+        ]
+        learning_outcomes = list(
+            _scoped(LearningOutcome.objects, "course_id", course_ids)
+            .order_by("id")
+            .values_list("id", "code", "course_id")
+        )
+        assessment_weights = {
+            (a_id, lo_id): weight
+            for a_id, lo_id, weight in _scoped(
+                AssessmentLearningOutcome.objects, "assesment__course_id", course_ids
+            ).values_list("assesment_id", "learning_outcome_id", "weight")
+        }
+        program_outcome_weights = {
+            (lo_id, po_code): weight
+            for lo_id, po_code, weight in _scoped(
+                ProgramLearningOutcome.objects,
+                "learning_outcome__course_id",
+                course_ids,
+            ).values_list("learning_outcome_id", "program_outcome__code", "weight")
+        }
+
+        if course_ids is None:
+            course_ids = sorted(
+                ({a[1] for a in assessments} | {lo[2] for lo in learning_outcomes})
+                - {None}
+            )
+
+        return cls(
+            course_ids,
+            [a for a in assessments if a[1] is not None],
+            [lo for lo in learning_outcomes if lo[2] is not None],
+            assessment_weights,
+            program_outcome_weights,
+        )
+
+    def with_changes(
+        self, assessment_weights=None, program_outcome_weights=None, score_shifts=None
+    ):
+        """
+        Returns a copy of the model with hypothetical changes applied:
+
+        - assessment_weights: {(assesment_id, learning_outcome_id): weight}
+        - program_outcome_weights: {(learning_outcome_id, program_outcome_code): weight}
+        - score_shifts: {assesment_id: points added to the average}
+
+        A weight of 0 removes the link. Shifted averages are clipped to 0–100.
+        """
+        score_shifts = score_shifts or {}
+        assessments = [
+            (
+                (a_id, course_id, name, min(max(average + score_shifts[a_id], 0), 100))
+                if a_id in score_shifts
+                else (a_id, course_id, name, average)
+            )
+            for a_id, course_id, name, average in self.assessments
+        ]
+        return AttainmentModel(
+            self.course_ids,
+            assessments,
+            self.learning_outcomes,
+            {**self.assessment_weights, **(assessment_weights or {})},
+            {**self.program_outcome_weights, **(program_outcome_weights or {})},
+        )
+
+    def compute(self):
+        """
+        Returns (lo_scores, po_totals, po_weights) where lo_scores is indexed
+        like `learning_outcomes` and po_totals/po_weights are
+        (course × program outcome) matrices.
+        """
+        n_lo = len(self.learning_outcomes)
+        n_po = len(self.program_outcome_codes)
+        n_cells = len(self.course_ids) * n_po
+
+        lo_totals = np.bincount(
+            self.alo_cols,
+            weights=self.alo_weights * self.averages[self.alo_rows],
+            minlength=n_lo,
+        )
+        lo_weights = np.bincount(
+            self.alo_cols, weights=self.alo_weights, minlength=n_lo
+        )
+        lo_scores = np.divide(
+            lo_totals, lo_weights, out=np.zeros(n_lo), where=lo_weights > 0
+        )
+
+        cells = self.learning_outcome_course[self.plo_rows] * n_po + self.plo_cols
+        po_totals = np.bincount(
+            cells,
+            weights=self.plo_weights * lo_scores[self.plo_rows],
+            minlength=n_cells,
+        ).reshape(len(self.course_ids), n_po)
+        po_weights = np.bincount(
+            cells, weights=self.plo_weights, minlength=n_cells
+        ).reshape(len(self.course_ids), n_po)
+
+        return lo_scores, po_totals, po_weights
+
+    def department_scores(self, po_totals, po_weights):
+        """
+        Rolls course PO contributions up into department PO attainment.
+        """
+        totals = po_totals.sum(axis=0)
+        weights = po_weights.sum(axis=0)
+        scores = np.divide(
+            totals, weights, out=np.zeros(len(totals)), where=weights > 0
+        )
+        return {
+            code: float(scores[i])
+            for i, code in enumerate(self.program_outcome_codes)
+            if weights[i] > 0
+        }
+
+    def to_attainment(self):
+        """
+        Returns the `compute_attainment` shape for every course in the model.
+        """
+        lo_scores, po_totals, po_weights = self.compute()
+        attainment = {course_id: _empty_report() for course_id in self.course_ids}
+
+        for a_id, course_id, name, average in self.assessments:
+            attainment[course_id]["assessments"][a_id] = {
+                "name": name,
+                "average": average,
+            }
+        for i, (lo_id, _, course_id) in enumerate(self.learning_outcomes):
+            attainment[course_id]["learning_outcomes"][lo_id] = float(lo_scores[i])
+        for c, p in zip(*np.nonzero(po_weights)):
+            attainment[self.course_ids[c]]["program_outcomes"][
+                self.program_outcome_codes[p]
+            ] = {"total": float(po_totals[c, p]), "weight": int(po_weights[c, p])}
+
+        return attainment
+
+
+def _coordinates(links):
+    if not links:
+        return (
+            np.zeros(0, dtype=np.intp),
+            np.zeros(0, dtype=np.intp),
+            np.zeros(0, dtype=float),
+        )
+    rows, cols, weights = zip(*links)
+    return (
+        np.array(rows, dtype=np.intp),
+        np.array(cols, dtype=np.intp),
+        np.array(weights, dtype=float),
+    )
+
+
+def compute_attainment(course_ids=None):
+    """
+    Computes assessment averages, learning outcome scores and program outcome
+    contributions for every course in `course_ids` (all courses when None)
+    from the assessment score summaries and the ALO/PLO weights.
+
+    The number of queries is fixed and does not depend on how many courses,
+    assessments or outcomes exist. This is what refreshes the materialized
+    attainment tables; reports read those through `load_attainment`.
+
+    Returns:
+    {
+        course_id: {
+            "assessments": {assesment_id: {"name": name, "average": avg}},
+            "learning_outcomes": {learning_outcome_id: score},
+            "program_outcomes": {
+                program_outcome_code: {"total": weighted_sum, "weight": weight_sum}
+            },
+        }
+    }
+    """
+    return AttainmentModel.load(course_ids).to_attainment()
+
+
+def load_attainment(course_ids=None):
+    """
+    Reads the materialized attainment tables for every course in `course_ids`
+    (all courses when None). Same return shape as `compute_attainment`.
+    """
+    if course_ids is not None:
+        course_ids = list(course_ids)
+
+    attainment = defaultdict(_empty_report)
+
+    for assesment_id, course_id, name, score_sum, score_count in (
+        _scoped(Assesment.objects, "course_id", course_ids)
+        .order_by("id")
+        .values_list(
+            "id",
+            "course_id",
+            "name",
+            "score_summary__score_sum",
+            "score_summary__score_count",
+        )
+    ):
+        attainment[course_id]["assessments"][assesment_id] = {
+            "name": name,
+            "average": score_sum / score_count if score_count else 0,
+        }
+
+    for lo_id, course_id, score in _scoped(
+        LearningOutcomeAttainment.objects, "learning_outcome__course_id", course_ids
+    ).values_list("learning_outcome_id", "learning_outcome__course_id", "score"):
+        attainment[course_id]["learning_outcomes"][lo_id] = score
+
+    for course_id, po_code, weighted_sum, weight_sum in _scoped(
+        CourseProgramOutcomeAttainment.objects, "course_id", course_ids
+    ).values_list("course_id", "program_outcome__code", "weighted_sum", "weight_sum"):
+        attainment[course_id]["program_outcomes"][po_code] = {
+            "total": weighted_sum,
+            "weight": weight_sum,
+        }
+
+    return dict(attainment)
+
 
 def calculate_course_report(course: Course):
     """
@@ -18,70 +344,193 @@ def calculate_course_report(course: Course):
         "program_outcomes": {program_outcome_code: score},
     }
     """
+    report = load_attainment([course.id]).get(course.id, _empty_report())
+    contributions = report["program_outcomes"]
 
-    # ===============================
-    # 1️⃣ ASSESSMENT AVERAGES
-    # ===============================
-    assessment_averages = {}
-
-    for assesment in course.assesments.all():
-        avg_score = (
-            StudentAssessmentScore.objects.filter(assesment=assesment).aggregate(
-                avg=Avg("score")
-            )["avg"]
-            or 0
+    program_outcome_scores = {}
+    for po_code in ProgramOutcome.objects.values_list("code", flat=True):
+        contribution = contributions.get(po_code)
+        program_outcome_scores[po_code] = (
+            round(contribution["total"] / contribution["weight"], 2)
+            if contribution and contribution["weight"] > 0
+            else 0
         )
 
-        assessment_averages[assesment.id] = round(avg_score, 2)
+    return {
+        "assessments": {
+            a_id: round(a["average"], 2) for a_id, a in report["assessments"].items()
+        },
+        "learning_outcomes": {
+            lo_id: round(score, 2)
+            for lo_id, score in report["learning_outcomes"].items()
+        },
+        "program_outcomes": program_outcome_scores,
+    }
+
+
+def calculate_department_report():
+    """
+    Returns the payload of /api/reports/generate/:
+    {
+        "reports": [
+            {
+                "course_code": ...,
+                "course_name": ...,
+                "assessments": {"<assesment_id>": {"label": ..., "average": ...}},
+                "program_outcome_contribution": {program_outcome_code: score},
+            }
+        ],
+        "program_outcomes": {program_outcome_code: score},
+    }
+    """
+    attainment = load_attainment()
+
+    program_outcome_totals = {}
+    program_outcome_weights = {}
+    course_reports = []
 
-    # ===============================
-    # 2️⃣ LEARNING OUTCOME SCORES
-    # ===============================
-    learning_outcome_scores = {}
+    for course_id, course_code, course_name in Course.objects.order_by(
+        "id"
+    ).values_list("id", "code", "name"):
+        report = attainment.get(course_id, _empty_report())
 
-    for lo in course.learning_outcomes.all():
-        weighted_sum = 0
-        total_weight = 0
+        # 🔹 TYPE COUNTERS (midterm → 1,2 / final → 1 ...)
+        type_counters = {}
+        assessment_results = {}
+        for a_id, a in report["assessments"].items():
+            name = a["name"]
+            type_counters[name] = type_counters.get(name, 0) + 1
+            assessment_results[str(a_id)] = {
+                "label": f"{ASSESMENT_LABELS.get(name, name)} {type_counters[name]}",
+                "average": round(a["average"], 2),
+            }
 
-        alo_links = AssessmentLearningOutcome.objects.filter(
-            learning_outcome=lo,
-            assesment__course=course,
-        )
+        course_po_contrib = {}
+        for po_code, contribution in report["program_outcomes"].items():
+            program_outcome_totals[po_code] = (
+                program_outcome_totals.get(po_code, 0) + contribution["total"]
+            )
+            program_outcome_weights[po_code] = (
+                program_outcome_weights.get(po_code, 0) + contribution["weight"]
+            )
+            course_po_contrib[po_code] = round(contribution["total"], 2)
 
-        for link in alo_links:
-            assesment_avg = assessment_averages.get(link.assesment_id, 0)
-            weighted_sum += assesment_avg * link.weight
-            total_weight += link.weight
+        course_reports.append(
+            {
+                "course_code": course_code,
+                "course_name": course_name,
+                "assessments": assessment_results,
+                "program_outcome_contribution": course_po_contrib,
+            }
+        )
 
-        learning_outcome_scores[lo.id] = (
-            round(weighted_sum / total_weight, 2) if total_weight > 0 else 0
+    final_program_outcomes = {
+        po: (
+            round(total / program_outcome_weights[po], 2)
+            if program_outcome_weights[po]
+            else 0
         )
+        for po, total in program_outcome_totals.items()
+    }
 
-    # ===============================
-    # 3️⃣ PROGRAM OUTCOME SCORES
-    # ===============================
-    program_outcome_scores = {}
+    return {
+        "reports": course_reports,
+        "program_outcomes": final_program_outcomes,
+    }
 
-    for po in ProgramOutcome.objects.all():
-        weighted_sum = 0
-        total_weight = 0
 
-        plo_links = ProgramLearningOutcome.objects.filter(
-            program_outcome=po,
-            learning_outcome__course=course,
-        )
+def calculate_what_if(
+    course_ids=None,
+    assessment_weights=(),
+    program_outcome_weights=(),
+    score_shifts=None,
+):
+    """
+    Recomputes PO attainment under hypothetical changes without touching the
+    database. Raises ValueError for unknown assessments or outcome codes.
 
-        for link in plo_links:
-            lo_score = learning_outcome_scores.get(link.learning_outcome_id, 0)
-            weighted_sum += lo_score * link.weight
-            total_weight += link.weight
+    - assessment_weights: [{"assessment_id", "learning_outcome", "weight"}]
+    - program_outcome_weights: [{"learning_outcome", "program_outcome", "weight"}]
+    - score_shifts: {assesment_id: points added to the average}
 
-        program_outcome_scores[po.code] = (
-            round(weighted_sum / total_weight, 2) if total_weight > 0 else 0
+    Returns:
+    {
+        "reports": [
+            {
+                "course_code": ...,
+                "course_name": ...,
+                "program_outcome_contribution": {program_outcome_code: score},
+            }
+        ],
+        "program_outcomes": {program_outcome_code: score},
+        "baseline_program_outcomes": {program_outcome_code: score},
+    }
+    """
+    model = AttainmentModel.load(course_ids)
+    lo_ids = {code: lo_id for lo_id, code, _ in model.learning_outcomes}
+    po_codes = set(ProgramOutcome.objects.values_list("code", flat=True))
+    score_shifts = {int(a_id): shift for a_id, shift in (score_shifts or {}).items()}
+
+    for a_id in [link["assessment_id"] for link in assessment_weights] + list(
+        score_shifts
+    ):
+        if a_id not in model.assessment_index:
+            raise ValueError(f"Assessment {a_id} not found.")
+    for link in [*assessment_weights, *program_outcome_weights]:
+        if link["learning_outcome"] not in lo_ids:
+            raise ValueError(f"Learning outcome {link['learning_outcome']} not found.")
+    for link in program_outcome_weights:
+        if link["program_outcome"] not in po_codes:
+            raise ValueError(f"Program outcome {link['program_outcome']} not found.")
+
+    scenario = model.with_changes(
+        assessment_weights={
+            (link["assessment_id"], lo_ids[link["learning_outcome"]]): link["weight"]
+            for link in assessment_weights
+        },
+        program_outcome_weights={
+            (lo_ids[link["learning_outcome"]], link["program_outcome"]): link["weight"]
+            for link in program_outcome_weights
+        },
+        score_shifts=score_shifts,
+    )
+
+    _, baseline_totals, baseline_weights = model.compute()
+    _, po_totals, po_weights = scenario.compute()
+
+    courses = {
+        course_id: (course_code, course_name)
+        for course_id, course_code, course_name in Course.objects.filter(
+            id__in=scenario.course_ids
+        ).values_list("id", "code", "name")
+    }
+
+    course_reports = []
+    for c, course_id in enumerate(scenario.course_ids):
+        if course_id not in courses:
+            continue
+        course_reports.append(
+            {
+                "course_code": courses[course_id][0],
+                "course_name": courses[course_id][1],
+                "program_outcome_contribution": {
+                    code: round(float(po_totals[c, p]), 2)
+                    for p, code in enumerate(scenario.program_outcome_codes)
+                    if po_weights[c, p]
+                },
+            }
         )
 
     return {
-        "assessments": assessment_averages,
-        "learning_outcomes": learning_outcome_scores,
-        "program_outcomes": program_outcome_scores,
+        "reports": course_reports,
+        "program_outcomes": {
+            code: round(score, 2)
+            for code, score in scenario.department_scores(po_totals, po_weights).items()
+        },
+        "baseline_program_outcomes": {
+            code: round(score, 2)
+            for code, score in model.department_scores(
+                baseline_totals, baseline_weights
+            ).items()
+        },
     }
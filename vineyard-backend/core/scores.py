@@ -0,0 +1,184 @@
+import math
+
+from django.db import connection, transaction
+
+from .attainment import (
+    apply_score_changes,
+    rebuild_score_summaries,
+    schedule_course_refresh,
+)
+from .models import Assesment, StudentAssessmentScore, User
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def parse_score(value):
+    """
+    Converts a submitted score to a float. Raises ValueError for values that
+    are not numbers, and for NaN and infinities, which would make every
+    later sum over the assessment unusable.
+    """
+    score = float(value)
+    if not math.isfinite(score):
+        raise ValueError(f"Score must be a finite number: {value!r}")
+    return score
+
+
+def upsert_scores(scores):
+    """
+    Writes `scores` ({(student_id, assesment_id): score}) with one bulk upsert
+    and folds the changes into the assessment score summaries.
+
+    Must run inside a transaction. The assessments are locked before the old
+    values are read, so concurrent writes of the same new (student,
+    assessment) pair cannot both count it as an insert.
+    """
+    if not scores:
+        return
+
+    student_ids = {student_id for student_id, _ in scores}
+    assessment_ids = {assesment_id for _, assesment_id in scores}
+    # Score rows that do not exist yet cannot be locked; the assessment rows
+    # always can. Locking in id order keeps concurrent writers from deadlocking.
+    list(
+        Assesment.objects.select_for_update()
+        .filter(id__in=assessment_ids)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    existing_scores = {
+        (student_id, assesment_id): score
+        for student_id, assesment_id, score in (
+            StudentAssessmentScore.objects.filter(
+                student_id__in=student_ids, assesment_id__in=assessment_ids
+            ).values_list("student_id", "assesment_id", "score")
+        )
+    }
+
+    StudentAssessmentScore.objects.bulk_create(
+        [
+            StudentAssessmentScore(
+                student_id=student_id, assesment_id=assesment_id, score=score
+            )
+            for (student_id, assesment_id), score in scores.items()
+        ],
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["student", "assesment"],
+        update_fields=["score"],
+    )
+
+    apply_score_changes(
+        (assesment_id, existing_scores.get((student_id, assesment_id)), score)
+        for (student_id, assesment_id), score in scores.items()
+    )
+
+
+def copy_load_scores(stream, sample_size=100):
+    """
+    Bulk-loads scores from a CSV stream with the columns
+    `username,assessment_id,score` (header row required) using PostgreSQL COPY.
+
+    The rows are copied into a temporary table and merged into
+    StudentAssessmentScore with a single INSERT ... ON CONFLICT; when a
+    (student, assessment) pair appears more than once the last row wins.
+    Unknown students and assessments are found with anti-joins and skipped,
+    as are NaN and infinite scores (reported by CSV line number).
+
+    Returns:
+    {
+        "rows": loaded_rows,
+        "saved": merged_rows,
+        "unknown_students": {"count": n, "sample": [...]},
+        "unknown_assessments": {"count": n, "sample": [...]},
+        "invalid_scores": {"count": n, "sample": [...]},
+    }
+    """
+    if connection.vendor != "postgresql":
+        raise NotImplementedError("COPY loading requires PostgreSQL.")
+
+    users = User._meta.db_table
+    assessments = Assesment._meta.db_table
+    scores = StudentAssessmentScore._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE score_load (
+                line bigserial,
+                username text NOT NULL,
+                assesment_id bigint NOT NULL,
+                score double precision NOT NULL
+            ) ON COMMIT DROP
+            """)
+        cursor.copy_expert(
+            "COPY score_load (username, assesment_id, score) "
+            "FROM STDIN WITH (FORMAT csv, HEADER true)",
+            stream,
+        )
+        cursor.execute("SELECT count(*) FROM score_load")
+        (loaded,) = cursor.fetchone()
+
+        cursor.execute(f"""
+            SELECT DISTINCT l.username FROM score_load l
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {users} u
+                WHERE u.username = l.username AND u.role = 'student'
+            )
+            """)
+        unknown_students = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"""
+            SELECT DISTINCT l.assesment_id FROM score_load l
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {assessments} a WHERE a.id = l.assesment_id
+            )
+            """)
+        unknown_assessments = [row[0] for row in cursor.fetchall()]
+
+        # PostgreSQL accepts NaN and infinities in double precision columns.
+        cursor.execute("""
+            SELECT line + 1 FROM score_load
+            WHERE score IN ('NaN', 'Infinity', '-Infinity')
+            ORDER BY line
+            """)
+        invalid_scores = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"""
+            INSERT INTO {scores} (student_id, assesment_id, score)
+            SELECT DISTINCT ON (u.id, l.assesment_id) u.id, l.assesment_id, l.score
+            FROM score_load l
+            JOIN {users} u ON u.username = l.username AND u.role = 'student'
+            JOIN {assessments} a ON a.id = l.assesment_id
+            WHERE l.score NOT IN ('NaN', 'Infinity', '-Infinity')
+            ORDER BY u.id, l.assesment_id, l.line DESC
+            ON CONFLICT (student_id, assesment_id)
+            DO UPDATE SET score = EXCLUDED.score
+            """)
+        saved = cursor.rowcount
+
+        cursor.execute(f"""
+            SELECT DISTINCT l.assesment_id FROM score_load l
+            JOIN {assessments} a ON a.id = l.assesment_id
+            WHERE l.score NOT IN ('NaN', 'Infinity', '-Infinity')
+            """)
+        affected = [row[0] for row in cursor.fetchall()]
+
+        rebuild_score_summaries(affected)
+        schedule_course_refresh(assessment_ids=affected)
+
+    return {
+        "rows": loaded,
+        "saved": saved,
+        "unknown_students": {
+            "count": len(unknown_students),
+            "sample": unknown_students[:sample_size],
+        },
+        "unknown_assessments": {
+            "count": len(unknown_assessments),
+            "sample": unknown_assessments[:sample_size],
+        },
+        "invalid_scores": {
+            "count": len(invalid_scores),
+            "sample": invalid_scores[:sample_size],
+        },
+    }
@@ -1,3 +1,6 @@
+from collections import Counter
+
+from core.attainment import schedule_course_refresh
 from core.models import (
     Assesment,
     AssessmentLearningOutcome,
@@ -10,6 +13,9 @@ from core.models import (
 )
 from django.contrib.auth.hashers import make_password
 from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 
 # -------------------- USER SERIALIZERS --------------------
@@ -21,71 +27,139 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "email", "role"]
 
 
-class TeacherCreateSerializer(serializers.Serializer):
-    username = serializers.CharField(max_length=25)
-    email = serializers.EmailField()
-
-    def validate_username(self, value):
-        qs = User.objects.filter(username=value)
-        if self.instance:
-            qs = qs.exclude(pk=self.instance.pk)
-        if qs.exists():
-            raise serializers.ValidationError("Username already taken.")
-        return value
+DEFAULT_PASSWORD = "dionysos"
+USERNAME_TAKEN = "Username already taken."
+EMAIL_TAKEN = "Email already taken."
+# Shared with the roster imports, which report one message per row.
+USERNAME_ERRORS = {
+    "required": "Missing username.",
+    "blank": "Missing username.",
+    "max_length": "Username longer than {max_length} characters.",
+}
+EMAIL_ERRORS = {
+    "required": "Missing email.",
+    "blank": "Missing email.",
+    "invalid": "Invalid email.",
+}
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """
+    many=True mode of the user create serializers. Usernames and emails of
+    the whole batch are checked with one IN query each, including duplicates
+    inside the batch, and the users are inserted with one bulk_create.
+    """
+
+    def check_batch(self, data):
+        """
+        Validates a list of user dicts without raising. Returns (items,
+        errors) in input order: the validated data or None, and a dict of
+        field errors that is empty for valid items.
+        """
+        items = []
+        errors = []
+        for item in data:
+            try:
+                items.append(self.run_child_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+
+        usernames = Counter(item["username"] for item in items if item)
+        emails = Counter(item["email"] for item in items if item)
+        taken_usernames = set(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        taken_emails = set(
+            User.objects.filter(email__in=emails).values_list("email", flat=True)
+        )
 
-    def validate_email(self, value):
-        qs = User.objects.filter(email=value)
-        if self.instance:
-            qs = qs.exclude(pk=self.instance.pk)
-        if qs.exists():
-            raise serializers.ValidationError("Email already taken")
-        return value
+        for item, item_errors in zip(items, errors):
+            if item is None:
+                continue
+            if item["username"] in taken_usernames:
+                item_errors["username"] = [USERNAME_TAKEN]
+            elif usernames[item["username"]] > 1:
+                item_errors["username"] = ["Username appears more than once."]
+            if item["email"] in taken_emails:
+                item_errors["email"] = [EMAIL_TAKEN]
+            elif emails[item["email"]] > 1:
+                item_errors["email"] = ["Email appears more than once."]
+        return items, errors
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data:
+            return super().to_internal_value(data)
+
+        items, errors = self.check_batch(data)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
 
     def create(self, validated_data):
-        return User.objects.create(
-            username=validated_data["username"],
-            email=validated_data["email"],
-            password=make_password("dionysos"),
-            role="teacher",
-            is_staff=True,
+        # Hashing is slow on purpose, so the default password is hashed once.
+        password = (
+            make_password(DEFAULT_PASSWORD)
+            if isinstance(self.child, DefaultPasswordUserSerializer)
+            else None
+        )
+        return User.objects.bulk_create(
+            [self.child.build_user(data, password) for data in validated_data]
         )
 
-    def update(self, instance, validated_data):
-        instance.username = validated_data.get("username", instance.username)
-        instance.email = validated_data.get("email", instance.email)
-        instance.save()
-        return instance
 
+class DefaultPasswordUserSerializer(serializers.Serializer):
+    """
+    Creates users of `role` with the default password. Pass many=True to
+    validate and create a batch at once (see UserListSerializer).
+    """
+
+    role = None
+    is_staff = False
+
+    username = serializers.CharField(max_length=25, error_messages=USERNAME_ERRORS)
+    email = serializers.EmailField(error_messages=EMAIL_ERRORS)
 
-class StudentCreateSerializer(serializers.Serializer):
-    username = serializers.CharField(max_length=25)
-    email = serializers.EmailField()
+    class Meta:
+        list_serializer_class = UserListSerializer
 
     def validate_username(self, value):
+        if isinstance(self.parent, UserListSerializer):
+            return value
         qs = User.objects.filter(username=value)
         if self.instance:
             qs = qs.exclude(pk=self.instance.pk)
         if qs.exists():
-            raise serializers.ValidationError("Username already taken.")
+            raise serializers.ValidationError(USERNAME_TAKEN)
         return value
 
     def validate_email(self, value):
+        if isinstance(self.parent, UserListSerializer):
+            return value
         qs = User.objects.filter(email=value)
         if self.instance:
             qs = qs.exclude(pk=self.instance.pk)
         if qs.exists():
-            raise serializers.ValidationError("Email already taken")
+            raise serializers.ValidationError(EMAIL_TAKEN)
         return value
 
-    def create(self, validated_data):
-        return User.objects.create(
+    def build_user(self, validated_data, password=None):
+        return User(
             username=validated_data["username"],
             email=validated_data["email"],
-            password=make_password("dionysos"),
-            role="student",
-            is_staff=False,
+            password=password or make_password(DEFAULT_PASSWORD),
+            role=self.role,
+            is_staff=self.is_staff,
         )
 
+    def create(self, validated_data):
+        user = self.build_user(validated_data)
+        user.save()
+        return user
+
     def update(self, instance, validated_data):
         instance.username = validated_data.get("username", instance.username)
         instance.email = validated_data.get("email", instance.email)
@@ -93,23 +167,43 @@ class StudentCreateSerializer(serializers.Serializer):
         return instance
 
 
+class TeacherCreateSerializer(DefaultPasswordUserSerializer):
+    role = "teacher"
+    is_staff = True
+
+
+class StudentCreateSerializer(DefaultPasswordUserSerializer):
+    role = "student"
+    is_staff = False
+
+
 class HeadUserSerializer(serializers.Serializer):
-    username = serializers.CharField(max_length=25)
-    email = serializers.EmailField(validators=[validate_email])
+    username = serializers.CharField(max_length=25, error_messages=USERNAME_ERRORS)
+    email = serializers.EmailField(
+        validators=[validate_email], error_messages=EMAIL_ERRORS
+    )
     password = serializers.CharField(min_length=8)
 
+    class Meta:
+        list_serializer_class = UserListSerializer
+
     def validate_username(self, value):
+        if isinstance(self.parent, UserListSerializer):
+            return value
         if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Username already taken.")
+            raise serializers.ValidationError(USERNAME_TAKEN)
         return value
 
     def validate_email(self, value):
+        if isinstance(self.parent, UserListSerializer):
+            return value
         if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Email already taken.")
+            raise serializers.ValidationError(EMAIL_TAKEN)
         return value
 
-    def create(self, validated_data):
-        user = User.objects.create(
+    def build_user(self, validated_data, password=None):
+        # Heads choose their own password; the shared default is ignored.
+        return User(
             username=validated_data["username"],
             email=validated_data["email"],
             password=make_password(validated_data["password"]),
@@ -117,6 +211,10 @@ class HeadUserSerializer(serializers.Serializer):
             is_superuser=True,
             is_staff=True,
         )
+
+    def create(self, validated_data):
+        user = self.build_user(validated_data)
+        user.save()
         return user
 
 
@@ -163,7 +261,7 @@ class ProgramLearningOutcomeSerializer(serializers.Serializer):
 
 
 class LearningOutcomeSerializer(serializers.Serializer):
-    code = serializers.CharField()
+    code = serializers.CharField(max_length=10)
     description = serializers.CharField()
     program_outcomes = ProgramLearningOutcomeSerializer(
         many=True, source="programlearningoutcome_set"
@@ -197,12 +295,8 @@ class CourseSummarySerializer(serializers.ModelSerializer):
     course_code = serializers.CharField(source="code")
     course_name = serializers.CharField(source="name")
     created_by = serializers.SerializerMethodField()
-    learning_outcome_count = serializers.IntegerField(
-        source="learning_outcomes.count", read_only=True
-    )
-    assessment_count = serializers.IntegerField(
-        source="assesments.count", read_only=True
-    )
+    learning_outcome_count = serializers.IntegerField(read_only=True)
+    assessment_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Course
@@ -215,12 +309,36 @@ class CourseSummarySerializer(serializers.ModelSerializer):
             "assessment_count",
         ]
 
+    @staticmethod
+    def setup_queryset(queryset):
+        """
+        Annotates the counts and joins the creator so a page of courses is
+        serialized from a single query.
+        """
+        return queryset.select_related("created_by").annotate(
+            learning_outcome_count=_count_per_course(LearningOutcome),
+            assessment_count=_count_per_course(Assesment),
+        )
+
     def get_created_by(self, obj):
         if obj.created_by:
             return {"username": obj.created_by.username}
         return {"username": "Unknown"}
 
 
+def _count_per_course(model):
+    # A correlated subquery per relation; joining both relations and counting
+    # distinct ids would multiply the rows of every course.
+    counts = (
+        model.objects.filter(course=OuterRef("pk"))
+        .order_by()
+        .values("course")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
 class CourseCreateSerializer(serializers.Serializer):
     course_code = serializers.CharField(max_length=10, source="code")
     course_name = serializers.CharField(max_length=100, source="name")
@@ -228,117 +346,277 @@ class CourseCreateSerializer(serializers.Serializer):
     assessments = AssessmentSerializer(many=True, required=False)
 
     def create(self, validated_data):
+        return create_courses([validated_data], self.context["request"].user)[0]
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """
+        Applies the submitted course as a diff against the stored one: only
+        changed outcomes, assessments and links are written, in bulk.
+        """
         user = self.context["request"].user
         learning_outcomes_data = validated_data.pop("learning_outcomes", [])
         assessments_data = validated_data.pop("assessments", [])
 
-        course = Course.objects.create(
-            **validated_data,  # code ve name
-            created_by=user,
-        )
+        code = validated_data.get("code", instance.code)
+        name = validated_data.get("name", instance.name)
+        if (code, name) != (instance.code, instance.name):
+            instance.code = code
+            instance.name = name
+            instance.save(update_fields=["code", "name"])
 
         # Learning Outcomes
-        for lo_data in learning_outcomes_data:
-            program_outcomes_data = lo_data.pop("programlearningoutcome_set", [])
-            lo = LearningOutcome.objects.create(
-                code=lo_data["code"],
-                description=lo_data["description"],
-                course=course,
-                created_by=user,
-            )
-            for po_data in program_outcomes_data:
-                try:
-                    po = ProgramOutcome.objects.get(
-                        code=po_data["program_outcome"]["code"]
+        existing_los = {lo.code: lo for lo in instance.learning_outcomes.all()}
+        incoming_los = {lo_data["code"]: lo_data for lo_data in learning_outcomes_data}
+
+        removed_lo_ids = [
+            lo.id for code, lo in existing_los.items() if code not in incoming_los
+        ]
+        new_los = []
+        changed_los = []
+        for code, lo_data in incoming_los.items():
+            lo = existing_los.get(code)
+            if lo is None:
+                new_los.append(
+                    LearningOutcome(
+                        code=code,
+                        description=lo_data["description"],
+                        course=instance,
+                        created_by=user,
                     )
-                except ProgramOutcome.DoesNotExist:
-                    continue
-                ProgramLearningOutcome.objects.create(
-                    learning_outcome=lo, program_outcome=po, weight=po_data["weight"]
                 )
+            elif lo.description != lo_data["description"]:
+                lo.description = lo_data["description"]
+                lo.created_by = user
+                changed_los.append(lo)
+
+        if removed_lo_ids:
+            LearningOutcome.objects.filter(id__in=removed_lo_ids).delete()
+        LearningOutcome.objects.bulk_update(changed_los, ["description", "created_by"])
+        LearningOutcome.objects.bulk_create(new_los)
+        changed = bool(removed_lo_ids or changed_los or new_los)
+
+        lo_ids = {
+            code: lo.id for code, lo in existing_los.items() if code in incoming_los
+        }
+        lo_ids.update({lo.code: lo.id for lo in new_los})
+
+        program_outcome_ids = dict(ProgramOutcome.objects.values_list("code", "id"))
+        wanted_po_links = {}
+        for code, lo_data in incoming_los.items():
+            for po_data in lo_data.get("programlearningoutcome_set", []):
+                po_id = program_outcome_ids.get(po_data["program_outcome"]["code"])
+                if po_id is not None:
+                    wanted_po_links[(lo_ids[code], po_id)] = po_data["weight"]
+
+        changed |= _sync_weighted_links(
+            ProgramLearningOutcome,
+            ProgramLearningOutcome.objects.filter(
+                learning_outcome_id__in=lo_ids.values()
+            ),
+            ("learning_outcome_id", "program_outcome_id"),
+            wanted_po_links,
+        )
 
         # Assessments
+        existing_assessments = {a.name: a for a in instance.assesments.all()}
+        kept_assessment_ids = []
+        new_assessments = []
+        submitted = []
         for a_data in assessments_data:
-            assessment = Assesment.objects.create(
-                name=a_data["assessment_type"],
-                course=course,
-                created_by=user,
-            )
-            for lo_info in a_data["learning_outcomes"]:
-                try:
-                    lo = LearningOutcome.objects.get(
-                        code=lo_info["learning_outcome"]["code"], course=course
-                    )
-                except LearningOutcome.DoesNotExist:
-                    continue
-                AssessmentLearningOutcome.objects.create(
-                    assesment=assessment, learning_outcome=lo, weight=lo_info["weight"]
+            assessment = existing_assessments.pop(a_data["assessment_type"], None)
+            if assessment is None:
+                assessment = Assesment(
+                    name=a_data["assessment_type"], course=instance, created_by=user
                 )
+                new_assessments.append(assessment)
+            else:
+                kept_assessment_ids.append(assessment.id)
+            submitted.append((assessment, a_data))
+
+        if existing_assessments:
+            Assesment.objects.filter(
+                id__in=[a.id for a in existing_assessments.values()]
+            ).delete()
+        Assesment.objects.bulk_create(new_assessments)
+        changed |= bool(existing_assessments or new_assessments)
+
+        wanted_lo_links = {}
+        for assessment, a_data in submitted:
+            for lo_info in a_data["learning_outcomes"]:
+                lo_id = lo_ids.get(lo_info["learning_outcome"]["code"])
+                if lo_id is not None:
+                    wanted_lo_links[(assessment.id, lo_id)] = lo_info["weight"]
+
+        changed |= _sync_weighted_links(
+            AssessmentLearningOutcome,
+            AssessmentLearningOutcome.objects.filter(
+                assesment_id__in=kept_assessment_ids
+            ),
+            ("assesment_id", "learning_outcome_id"),
+            wanted_lo_links,
+        )
 
-        return course
+        # Bulk writes skip the model signals, so refresh the attainment rows
+        # (and with them the cached reports) explicitly.
+        if changed:
+            schedule_course_refresh(course_ids=[instance.id])
 
-    def update(self, instance, validated_data):
-        user = self.context["request"].user
-        learning_outcomes_data = validated_data.pop("learning_outcomes", [])
-        assessments_data = validated_data.pop("assessments", [])
+        return instance
 
-        instance.code = validated_data.get("code", instance.code)
-        instance.name = validated_data.get("name", instance.name)
-        instance.save()
 
-        # Learning Outcomes
-        incoming_lo_codes = [lo_data["code"] for lo_data in learning_outcomes_data]
-        for lo in instance.learning_outcomes.all():
-            if lo.code not in incoming_lo_codes:
-                lo.delete()
-
-        for lo_data in learning_outcomes_data:
-            program_outcomes_data = lo_data.pop("programlearningoutcome_set", [])
-            lo, _ = LearningOutcome.objects.update_or_create(
+@transaction.atomic
+def create_courses(courses_data, user):
+    """
+    Creates courses from CourseCreateSerializer validated data with one bulk
+    insert per table for the whole list. Links to unknown program outcome or
+    learning outcome codes are skipped.
+
+    Returns the created courses in input order.
+    """
+    courses = Course.objects.bulk_create(
+        [
+            Course(code=data["code"], name=data["name"], created_by=user)
+            for data in courses_data
+        ]
+    )
+
+    program_outcomes = ProgramOutcome.objects.in_bulk(
+        {
+            po_data["program_outcome"]["code"]
+            for data in courses_data
+            for lo_data in data.get("learning_outcomes", [])
+            for po_data in lo_data.get("programlearningoutcome_set", [])
+        },
+        field_name="code",
+    )
+
+    # Learning Outcomes
+    learning_outcome_data = [
+        (course, lo_data)
+        for course, data in zip(courses, courses_data)
+        for lo_data in data.get("learning_outcomes", [])
+    ]
+    learning_outcomes = LearningOutcome.objects.bulk_create(
+        [
+            LearningOutcome(
                 code=lo_data["code"],
-                course=instance,
-                defaults={"description": lo_data["description"], "created_by": user},
+                description=lo_data["description"],
+                course=course,
+                created_by=user,
             )
-            ProgramLearningOutcome.objects.filter(learning_outcome=lo).delete()
-            for po_data in program_outcomes_data:
-                try:
-                    po = ProgramOutcome.objects.get(
-                        code=po_data["program_outcome"]["code"]
-                    )
-                except ProgramOutcome.DoesNotExist:
-                    continue
-                ProgramLearningOutcome.objects.create(
-                    learning_outcome=lo, program_outcome=po, weight=po_data["weight"]
-                )
-
-        # Assessments
-        existing_assessments = {a.name: a for a in instance.assesments.all()}
-        for a_data in assessments_data:
-            a_name = a_data["assessment_type"]
-            assessment = existing_assessments.pop(a_name, None)
-            if not assessment:
-                assessment = Assesment.objects.create(
-                    name=a_name, course=instance, created_by=user
-                )
-            else:
-                assessment.save()
+            for course, lo_data in learning_outcome_data
+        ]
+    )
+    ProgramLearningOutcome.objects.bulk_create(
+        [
+            ProgramLearningOutcome(
+                learning_outcome=lo,
+                program_outcome=program_outcomes[po_data["program_outcome"]["code"]],
+                weight=po_data["weight"],
+            )
+            for lo, (_, lo_data) in zip(learning_outcomes, learning_outcome_data)
+            for po_data in lo_data.get("programlearningoutcome_set", [])
+            if po_data["program_outcome"]["code"] in program_outcomes
+        ]
+    )
 
-            AssessmentLearningOutcome.objects.filter(assesment=assessment).delete()
-            for lo_info in a_data["learning_outcomes"]:
-                try:
-                    lo = LearningOutcome.objects.get(
-                        code=lo_info["learning_outcome"]["code"], course=instance
-                    )
-                except LearningOutcome.DoesNotExist:
-                    continue
-                AssessmentLearningOutcome.objects.create(
-                    assesment=assessment, learning_outcome=lo, weight=lo_info["weight"]
-                )
+    # Assessments
+    learning_outcomes_by_code = {
+        (lo.course_id, lo.code): lo for lo in learning_outcomes
+    }
+    assessment_data = [
+        (course, a_data)
+        for course, data in zip(courses, courses_data)
+        for a_data in data.get("assessments", [])
+    ]
+    assessments = Assesment.objects.bulk_create(
+        [
+            Assesment(name=a_data["assessment_type"], course=course, created_by=user)
+            for course, a_data in assessment_data
+        ]
+    )
+    AssessmentLearningOutcome.objects.bulk_create(
+        [
+            AssessmentLearningOutcome(
+                assesment=assessment,
+                learning_outcome=learning_outcomes_by_code[
+                    (course.id, lo_info["learning_outcome"]["code"])
+                ],
+                weight=lo_info["weight"],
+            )
+            for assessment, (course, a_data) in zip(assessments, assessment_data)
+            for lo_info in a_data["learning_outcomes"]
+            if (course.id, lo_info["learning_outcome"]["code"])
+            in learning_outcomes_by_code
+        ]
+    )
 
-        for remaining in existing_assessments.values():
-            remaining.delete()
+    # Bulk writes skip the model signals.
+    schedule_course_refresh(course_ids=[course.id for course in courses])
+    return courses
+
+
+def _sync_weighted_links(model, current, key_fields, wanted):
+    """
+    Makes the `current` link rows match `wanted` ({(id, id): weight}, keyed by
+    `key_fields`) with bulk deletes, updates and inserts. Returns True if any
+    row was written.
+    """
+    seen = set()
+    stale_ids = []
+    changed = []
+    for link in current:
+        key = tuple(getattr(link, field) for field in key_fields)
+        if key not in wanted or key in seen:
+            stale_ids.append(link.id)
+            continue
+        seen.add(key)
+        if link.weight != wanted[key]:
+            link.weight = wanted[key]
+            changed.append(link)
+
+    missing = [
+        model(**dict(zip(key_fields, key)), weight=weight)
+        for key, weight in wanted.items()
+        if key not in seen
+    ]
+
+    if stale_ids:
+        model.objects.filter(id__in=stale_ids).delete()
+    model.objects.bulk_update(changed, ["weight"])
+    model.objects.bulk_create(missing)
+    return bool(stale_ids or changed or missing)
+
+
+# -------------------- REPORT SERIALIZERS --------------------
+
+
+class WhatIfAssessmentWeightSerializer(serializers.Serializer):
+    assessment_id = serializers.IntegerField()
+    learning_outcome = serializers.CharField()
+    weight = serializers.IntegerField(min_value=0, max_value=5)
+
+
+class WhatIfProgramOutcomeWeightSerializer(serializers.Serializer):
+    learning_outcome = serializers.CharField()
+    program_outcome = serializers.CharField()
+    weight = serializers.IntegerField(min_value=0, max_value=5)
+
+
+class WhatIfScenarioSerializer(serializers.Serializer):
+    courses = serializers.ListField(child=serializers.IntegerField(), required=False)
+    assessment_weights = WhatIfAssessmentWeightSerializer(many=True, required=False)
+    program_outcome_weights = WhatIfProgramOutcomeWeightSerializer(
+        many=True, required=False
+    )
+    score_shifts = serializers.DictField(child=serializers.FloatField(), required=False)
 
-        return instance
+    def validate_score_shifts(self, value):
+        try:
+            return {int(a_id): shift for a_id, shift in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Keys must be assessment ids.")
 
 
 class UserDetailSerializer(serializers.ModelSerializer):
@@ -405,6 +683,27 @@ class CourseDetailSerializer(serializers.ModelSerializer):
             "assessments",
         ]
 
+    @staticmethod
+    def setup_queryset(queryset):
+        """
+        Prefetches the whole outcome/assessment tree so a course is
+        serialized in a fixed number of queries.
+        """
+        return queryset.select_related("created_by").prefetch_related(
+            Prefetch(
+                "learning_outcomes__programlearningoutcome_set",
+                queryset=ProgramLearningOutcome.objects.select_related(
+                    "program_outcome"
+                ),
+            ),
+            Prefetch(
+                "assesments__assessmentlearningoutcome_set",
+                queryset=AssessmentLearningOutcome.objects.select_related(
+                    "learning_outcome"
+                ),
+            ),
+        )
+
 
 class StudentAssessmentScoreSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,84 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .attainment import apply_score_changes, schedule_course_refresh
+from .models import (
+    Assesment,
+    AssessmentLearningOutcome,
+    Course,
+    LearningOutcome,
+    ProgramLearningOutcome,
+    ProgramOutcome,
+    StudentAssessmentScore,
+)
+from .report_cache import bump_course_versions, bump_global_version
+
+# Changes to scores, weights, LOs and assessments refresh the course's
+# attainment rows, and the refresh bumps the course's report cache version.
+
+
+@receiver(pre_save, sender=StudentAssessmentScore)
+def score_saving(sender, instance, **kwargs):
+    # Bulk writes (upsert_scores, COPY loads) fold their own changes; this
+    # covers single saves from the admin, the shell and the like.
+    instance._previous = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("assesment_id", "score")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=StudentAssessmentScore)
+def score_saved(sender, instance, **kwargs):
+    changes = [(instance.assesment_id, None, instance.score)]
+    assessment_ids = [instance.assesment_id]
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        previous_assesment_id, previous_score = previous
+        changes.append((previous_assesment_id, previous_score, None))
+        assessment_ids.append(previous_assesment_id)
+    apply_score_changes(changes)
+    schedule_course_refresh(assessment_ids=assessment_ids)
+
+
+@receiver(post_delete, sender=StudentAssessmentScore)
+def score_deleted(sender, instance, **kwargs):
+    # The summary may already be gone when the assessment itself is deleted.
+    apply_score_changes(
+        [(instance.assesment_id, instance.score, None)], create_missing=False
+    )
+    schedule_course_refresh(assessment_ids=[instance.assesment_id])
+
+
+@receiver(post_save, sender=AssessmentLearningOutcome)
+@receiver(post_delete, sender=AssessmentLearningOutcome)
+def assessment_link_changed(sender, instance, **kwargs):
+    schedule_course_refresh(assessment_ids=[instance.assesment_id])
+
+
+@receiver(post_save, sender=ProgramLearningOutcome)
+@receiver(post_delete, sender=ProgramLearningOutcome)
+def program_link_changed(sender, instance, **kwargs):
+    schedule_course_refresh(learning_outcome_ids=[instance.learning_outcome_id])
+
+
+@receiver(post_save, sender=LearningOutcome)
+@receiver(post_delete, sender=LearningOutcome)
+@receiver(post_save, sender=Assesment)
+@receiver(post_delete, sender=Assesment)
+def course_structure_changed(sender, instance, **kwargs):
+    schedule_course_refresh(course_ids=[instance.course_id])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump_course_versions([instance.id])
+
+
+@receiver(post_save, sender=ProgramOutcome)
+@receiver(post_delete, sender=ProgramOutcome)
+def program_outcome_changed(sender, instance, **kwargs):
+    bump_global_version()
@@ -0,0 +1,207 @@
+import functools
+import logging
+import re
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer of gpt-4o, the model generate prompts.
+TOKEN_ENCODING = "o200k_base"
+
+# (section, heading pattern) checked in order against the start of each line.
+SECTION_PATTERNS = [
+    ("aims", r"(course\s+)?(aims?|goals?|objectives?|purpose)"),
+    (
+        "outcomes",
+        r"((intended|expected)\s+)?((learning|course)\s+)?(outcomes?|outputs?)",
+    ),
+    ("content", r"(course\s+)?(contents?|description|topics\s+covered)"),
+    ("assessment", r"(methods\s+of\s+)?(assessment|evaluation|grading)"),
+    (
+        "schedule",
+        r"(weekly\s+(topics|schedule|plan|program)|(course\s+)?(schedule|outline)"
+        r"|week\b)",
+    ),
+    (
+        "references",
+        r"(references?|textbooks?|bibliography|resources"
+        r"|((required|recommended|supplementary)\s+)?(readings?|materials?))",
+    ),
+    ("workload", r"(ects|workload|(student\s+)?working\s+hours?)"),
+    (
+        "policies",
+        r"(attendance|academic\s+(integrity|honesty)|plagiarism|polic(y|ies)"
+        r"|make-?up|late\s+submissions?|office\s+hours?|instructors?|assistants?"
+        r"|contact)",
+    ),
+]
+SECTION_PATTERNS = [
+    (section, re.compile(rf"{pattern}\b", re.IGNORECASE))
+    for section, pattern in SECTION_PATTERNS
+]
+# The prompt asks for outcomes based on the aims, outputs and content, and for
+# the evaluation components. The preamble holds the course title and code.
+PROMPT_SECTIONS = {"preamble", "aims", "outcomes", "content", "assessment"}
+# Many syllabi list their content only as a weekly schedule.
+CONTENT_FALLBACK = "schedule"
+# Dropping text by mistake costs more than keeping it, so lines only open a
+# dropped section when they look like a heading rather than a table row.
+DROP_HEADING_MAX_WORDS = 8
+
+_SPACES = re.compile(r"[ \t\f\v\u00a0]+")
+# Rough stand-in for BPE tokens: words split into four-character pieces, and
+# punctuation marks.
+_TOKEN_ESTIMATE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:
+        # Not installed, or the encoding file could not be downloaded.
+        logger.warning("tiktoken unavailable, estimating token counts")
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return len(_TOKEN_ESTIMATE.findall(text))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, budget):
+    """
+    Returns the longest prefix of `text` within `budget` tokens, cut at a line
+    break when there is one.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        matches = _TOKEN_ESTIMATE.finditer(text)
+        end = 0
+        for count, match in enumerate(matches, 1):
+            if count > budget:
+                break
+            end = match.end()
+        else:
+            return text
+        prefix = text[:end]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= budget:
+            return text
+        prefix = encoding.decode(tokens[:budget])
+
+    cut = prefix.rfind("\n")
+    return prefix[:cut] if cut > 0 else prefix
+
+
+def normalize_whitespace(text):
+    lines = (_SPACES.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _section_of(line):
+    for section, pattern in SECTION_PATTERNS:
+        if pattern.match(line):
+            if (
+                section not in PROMPT_SECTIONS
+                and section != CONTENT_FALLBACK
+                and (
+                    len(line.split()) > DROP_HEADING_MAX_WORDS
+                    or any(c.isdigit() for c in line)
+                )
+            ):
+                return None
+            return section
+    return None
+
+
+def split_sections(text):
+    """
+    Splits normalized syllabus text into (section, text) pairs at heading
+    lines. Text before the first heading is the "preamble".
+    """
+    sections = []
+    section, lines = "preamble", []
+    for line in text.split("\n"):
+        heading = _section_of(line)
+        if heading is not None and heading != section:
+            if lines:
+                sections.append((section, "\n".join(lines)))
+            section, lines = heading, []
+        lines.append(line)
+    if lines:
+        sections.append((section, "\n".join(lines)))
+    return sections
+
+
+def _fit(sections, budget):
+    """
+    Joins sections within `budget` tokens, dropping the content fallback and
+    then cutting every section in proportion to its length as needed.
+    """
+    counts = [count_tokens(text) for _, text in sections]
+    if sum(counts) > budget and len(sections) > 1:
+        trimmed = [
+            (section, count)
+            for section, count in zip(sections, counts)
+            if section[0] != CONTENT_FALLBACK
+        ]
+        if trimmed:
+            sections, counts = map(list, zip(*trimmed))
+
+    total = sum(counts)
+    if total > budget:
+        return "\n".join(
+            truncate_tokens(text, budget * count // total)
+            for (_, text), count in zip(sections, counts)
+        )
+    return "\n".join(text for _, text in sections)
+
+
+def reduce_syllabus(text, budget=None):
+    """
+    Keeps the parts of a syllabus the generate prompt needs and fits them into
+    `budget` tokens (default settings.GENERATE_SYLLABUS_TOKEN_BUDGET).
+
+    Returns {"text", "original_tokens", "tokens", "saved_tokens"}.
+    """
+    budget = budget or settings.GENERATE_SYLLABUS_TOKEN_BUDGET
+    original_tokens = count_tokens(text)
+    normalized = normalize_whitespace(text)
+    sections = split_sections(normalized)
+    found = {section for section, _ in sections}
+
+    if found & PROMPT_SECTIONS - {"preamble"}:
+        wanted = (
+            PROMPT_SECTIONS
+            if "content" in found
+            else PROMPT_SECTIONS | {CONTENT_FALLBACK}
+        )
+        # Sections of a kind that appears more than once are fitted together.
+        merged = {}
+        for section, section_text in sections:
+            if section in wanted:
+                merged[section] = (
+                    f"{merged[section]}\n{section_text}"
+                    if section in merged
+                    else section_text
+                )
+        reduced = _fit(list(merged.items()), budget)
+    else:
+        # No recognizable structure; send everything rather than guess.
+        reduced = normalized
+
+    reduced = truncate_tokens(reduced, budget)
+    tokens = count_tokens(reduced)
+    return {
+        "text": reduced,
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "saved_tokens": max(original_tokens - tokens, 0),
+    }
@@ -1,66 +1,53 @@
-import io
 import json
 
-import pdfplumber
 from celery import shared_task
-from docx import Document
 from openai import OpenAI
 
-client = OpenAI()
-
-
-def extract_docx_text(file_bytes: bytes) -> str:
-    doc = Document(io.BytesIO(file_bytes))
-    text = []
-
-    for para in doc.paragraphs:
-        if para.text.strip():
-            text.append(para.text)
+from .blobs import blob_digest, blob_path, cleanup_blobs
+from .extraction import TEXT_EXTRACTOR_VERSION, extract_syllabus_text
+from .generate_cache import cache_result, cache_text, get_cached_text
+from .imports import (
+    import_course_grades,
+    import_curriculum,
+    import_enrollments,
+    import_users,
+    iter_csv_dicts,
+    iter_curriculum,
+    iter_enrollment_rows,
+    iter_spreadsheet_rows,
+    spreadsheet_row_count,
+)
+from .models import Course, User
+from .syllabus import reduce_syllabus
 
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                cell_text = cell.text.strip()
-                if cell_text:
-                    text.append(cell_text)
-
-    for section in doc.sections:
-        header = section.header
-        footer = section.footer
-
-        for para in header.paragraphs:
-            if para.text.strip():
-                text.append(para.text)
-
-        for para in footer.paragraphs:
-            if para.text.strip():
-                text.append(para.text)
+client = OpenAI()
 
-    return "\n".join(text)
+SYLLABUS_TYPES = ("docx", "pdf")
+# Bump when the generate prompt or model changes, so cached mappings made
+# with the old one are not served.
+GENERATE_PROMPT_VERSION = 2
 
 
 @shared_task
-def generate(file_bytes: bytes, filename: str, program_outcomes_str: str):
-
-    text_content = ""
-    suffix = filename.split(".")[-1].lower()
-
-    if suffix == "docx":
-        text_content = extract_docx_text(file_bytes)
-    elif suffix == "pdf":
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text_content += page_text + "\n"
-    else:
+def generate(blob_key: str, program_outcomes_str: str):
+    suffix = blob_key.split(".")[-1].lower()
+    if suffix not in SYLLABUS_TYPES:
         return {"error": "Unsupported file type"}
 
+    digest = blob_digest(blob_key)
+    text_content = get_cached_text(digest, TEXT_EXTRACTOR_VERSION)
+    if text_content is None:
+        text_content = extract_syllabus_text(blob_path(blob_key), suffix, digest)
+        cache_text(digest, TEXT_EXTRACTOR_VERSION, text_content)
+
+    # Only the aims, outcomes, content and evaluation sections are sent.
+    syllabus = reduce_syllabus(text_content)
+
     prompt = f"""
 You are a university course coordinator. I will provide a syllabus for a course and a list of Program Outcomes (POs).
 
 Syllabus:
-{text_content}
+{syllabus['text']}
 
 Program Outcomes:
 {program_outcomes_str}
@@ -111,6 +98,17 @@ Instructions:
         except json.JSONDecodeError:
             result_json = {"raw_text": result_text}
 
+    if isinstance(result_json, dict):
+        result_json["syllabus_tokens"] = {
+            "original": syllabus["original_tokens"],
+            "sent": syllabus["tokens"],
+            "saved": syllabus["saved_tokens"],
+        }
+
+    # Unparseable answers are not cached so a retry asks the model again.
+    if "raw_text" not in result_json:
+        cache_result(digest, program_outcomes_str, GENERATE_PROMPT_VERSION, result_json)
+
     return result_json
 
 
@@ -176,3 +174,63 @@ Do not include any markdown, explanations, or text outside the JSON.
             result_json = {"raw_text": result_text}
 
     return result_json
+
+
+@shared_task(bind=True)
+def import_grades(self, course_id: int, blob_key: str):
+    course = Course.objects.get(id=course_id)
+    path = blob_path(blob_key)
+    total = spreadsheet_row_count(path)
+
+    def progress(processed, saved, error_count):
+        self.update_state(
+            state="PROGRESS",
+            meta={
+                "processed": processed,
+                "total": total,
+                "saved": saved,
+                "errors": error_count,
+            },
+        )
+
+    return import_course_grades(course, iter_spreadsheet_rows(path), progress=progress)
+
+
+@shared_task(bind=True)
+def import_users_task(self, blob_key: str, role: str):
+    def progress(processed, created, error_count):
+        self.update_state(
+            state="PROGRESS",
+            meta={"processed": processed, "created": created, "errors": error_count},
+        )
+
+    return import_users(iter_csv_dicts(blob_path(blob_key)), role, progress=progress)
+
+
+@shared_task(bind=True)
+def import_enrollments_task(self, blob_key: str):
+    def progress(processed, enrolled, error_count):
+        self.update_state(
+            state="PROGRESS",
+            meta={"processed": processed, "enrolled": enrolled, "errors": error_count},
+        )
+
+    return import_enrollments(
+        iter_enrollment_rows(blob_path(blob_key)), progress=progress
+    )
+
+
+@shared_task(bind=True)
+def import_curriculum_task(self, blob_key: str, user_id: int):
+    def progress(saved, total):
+        self.update_state(state="PROGRESS", meta={"saved": saved, "total": total})
+
+    user = User.objects.filter(id=user_id).first()
+    return import_curriculum(
+        iter_curriculum(blob_path(blob_key)), user, progress=progress
+    )
+
+
+@shared_task
+def cleanup_blobs_task():
+    return {"removed": cleanup_blobs()}
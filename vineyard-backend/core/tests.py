@@ -1,3 +1,492 @@
-from django.test import TestCase
+import io
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from docx import Document
+from docx.enum.section import WD_SECTION
+
+from .archive import dump_archive, iter_archive, restore_archive
+from .extraction import extract_docx_text
+from .imports import import_course_grades, import_curriculum, import_users
+from .models import (
+    Assesment,
+    AssessmentLearningOutcome,
+    AssessmentScoreSummary,
+    Course,
+    LearningOutcome,
+    ProgramOutcome,
+    StudentAssessmentScore,
+    User,
+)
+from .report_cache import (
+    bump_course_versions,
+    get_course_report,
+    get_department_report,
+    get_or_compute,
+)
+from .serializers import DEFAULT_PASSWORD
+from .syllabus import count_tokens, reduce_syllabus
+
+
+def _save(document):
+    buffer = io.BytesIO()
+    document.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class DocxExtractionParityTests(SimpleTestCase):
+    def extract(self, document):
+        data = _save(document).getvalue()
+        return (
+            extract_docx_text(io.BytesIO(data), backend="stream"),
+            extract_docx_text(io.BytesIO(data), backend="python-docx"),
+        )
+
+    def test_same_text_as_python_docx(self):
+        document = Document()
+        document.add_heading("CSE 301 Computer Architecture", level=1)
+        document.add_paragraph("Course Aims\tIntroduce computer design.")
+        paragraph = document.add_paragraph("Line one")
+        paragraph.add_run().add_break()
+        paragraph.add_run("line two")
+        document.add_paragraph("   ")
+        table = document.add_table(rows=3, cols=3)
+        for i, row in enumerate(table.rows):
+            for j, cell in enumerate(row.cells):
+                cell.text = f"r{i}c{j}" if (i, j) != (1, 1) else ""
+        table.cell(2, 2).add_paragraph("second paragraph")
+        section = document.sections[0]
+        section.header.paragraphs[0].text = "ACIBADEM UNIVERSITY"
+        section.footer.paragraphs[0].text = "Page footer"
+
+        streamed, reference = self.extract(document)
+
+        self.assertEqual(streamed, reference)
+        self.assertIn("r2c2\nsecond paragraph", streamed)
+        self.assertIn("Line one\nline two", streamed)
+
+    def test_merged_cells_appear_once(self):
+        document = Document()
+        table = document.add_table(rows=3, cols=3)
+        table.cell(0, 0).merge(table.cell(0, 2)).text = "Evaluation"
+        table.cell(1, 0).merge(table.cell(2, 0)).text = "Midterm"
+        table.cell(1, 1).text = "40%"
+        table.cell(2, 1).text = "60%"
+
+        streamed, reference = self.extract(document)
+
+        self.assertEqual(streamed.split("\n"), ["Evaluation", "Midterm", "40%", "60%"])
+        self.assertEqual(reference.count("Evaluation"), 3)
+        self.assertEqual(reference.count("Midterm"), 2)
+        self.assertEqual(set(streamed.split("\n")), set(reference.split("\n")))
+
+    def test_tables_keep_their_place(self):
+        document = Document()
+        document.add_paragraph("Course Content")
+        document.add_table(rows=1, cols=2).rows[0].cells[0].text = "Week 1"
+        document.add_paragraph("Assessment")
+
+        streamed, reference = self.extract(document)
+
+        self.assertEqual(
+            streamed.split("\n"), ["Course Content", "Week 1", "Assessment"]
+        )
+        self.assertEqual(Counter(streamed.split("\n")), Counter(reference.split("\n")))
+
+    def test_shared_header_appears_once(self):
+        document = Document()
+        document.sections[0].header.paragraphs[0].text = "Syllabus"
+        document.add_paragraph("Part one")
+        document.add_section(WD_SECTION.NEW_PAGE)
+        document.add_paragraph("Part two")
+
+        streamed, reference = self.extract(document)
+
+        self.assertEqual(streamed.split("\n"), ["Part one", "Part two", "Syllabus"])
+        self.assertEqual(reference.count("Syllabus"), 2)
+
+
+SYLLABUS = """\
+Course Title Code Semester Credit ECTS
+Software CSE 311 Fall 3 6
+Instructor
+Prof. Dr. Example
+Goals
+This course covers software development processes.
+Learning Outcomes
+1. Apply agile practices on a team project.
+Assessment Components Weight
+Midterm 25%
+Attendance & Participation 10%
+Project 65%
+WEEKLY TOPICS
+1. Introduction 23 Sep.
+2. Agile Practices 30 Sep.
+REFERENCES
+Scrum: The Art of Doing Twice the Work in Half the Time.
+ECTS / WORKING HOUR TABLE
+Duration of the Course 15 3 45
+"""
+
+
+class SyllabusReductionTests(SimpleTestCase):
+    def test_keeps_only_prompt_sections(self):
+        reduced = reduce_syllabus(SYLLABUS, budget=1000)
+
+        lines = reduced["text"].split("\n")
+        self.assertIn("Software CSE 311 Fall 3 6", lines)
+        self.assertIn("1. Apply agile practices on a team project.", lines)
+        # A table row is not mistaken for an attendance policy heading.
+        self.assertIn("Project 65%", lines)
+        # Without a content section the weekly topics stand in for it.
+        self.assertIn("2. Agile Practices 30 Sep.", lines)
+        for dropped in ("Prof. Dr. Example", "REFERENCES", "ECTS / WORKING HOUR TABLE"):
+            self.assertNotIn(dropped, lines)
+        self.assertEqual(
+            reduced["saved_tokens"],
+            reduced["original_tokens"] - reduced["tokens"],
+        )
+        self.assertGreater(reduced["saved_tokens"], 0)
+
+    def test_schedule_dropped_when_there_is_a_content_section(self):
+        text = SYLLABUS.replace(
+            "Goals\n", "Course Contents Processes, agile, testing\nGoals\n"
+        )
+
+        reduced = reduce_syllabus(text, budget=1000)
+
+        self.assertIn("Course Contents Processes, agile, testing", reduced["text"])
+        self.assertNotIn("WEEKLY TOPICS", reduced["text"])
+
+    def test_token_budget(self):
+        reduced = reduce_syllabus(SYLLABUS * 20, budget=100)
+
+        self.assertLessEqual(reduced["tokens"], 100)
+        self.assertEqual(reduced["tokens"], count_tokens(reduced["text"]))
+        self.assertIn("Goals", reduced["text"])
+        self.assertIn("Assessment Components Weight", reduced["text"])
+
+
+class ArchiveRoundTripTests(TestCase):
+    def setUp(self):
+        self.head = User.objects.create_user(
+            username="head",
+            email="head@example.com",
+            password="x",
+            role="head",
+            is_staff=True,
+            is_superuser=True,
+        )
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="x",
+            role="student",
+        )
+        course = Course.objects.create(
+            code="CS101", name="Course", created_by=self.head
+        )
+        course.students.add(self.student)
+        outcome = LearningOutcome.objects.create(
+            code="CS101-LO1", description="", course=course
+        )
+        for weight, score in ((2, 40), (5, 90)):
+            midterm = Assesment.objects.create(
+                name="midterm", course=course, created_by=self.head
+            )
+            AssessmentLearningOutcome.objects.create(
+                assesment=midterm, learning_outcome=outcome, weight=weight
+            )
+            StudentAssessmentScore.objects.create(
+                student=self.student, assesment=midterm, score=score
+            )
+
+    def round_trip(self):
+        archive = io.StringIO()
+        dump_archive(archive)
+        User.objects.all().delete()
+        Course.objects.all().delete()
+        archive.seek(0)
+        return restore_archive(iter_archive(archive))
+
+    def midterms(self):
+        return [
+            (
+                midterm.assessmentlearningoutcome_set.get().weight,
+                midterm.student_scores.get().score,
+                midterm.created_by.username,
+            )
+            for midterm in Assesment.objects.filter(course__code="CS101").order_by("id")
+        ]
+
+    def test_assessments_sharing_a_name_survive(self):
+        before = self.midterms()
+
+        result = self.round_trip()
+
+        self.assertEqual(self.midterms(), before)
+        self.assertEqual(before, [(2, 40, "head"), (5, 90, "head")])
+        self.assertEqual(result["restored"]["assessment"], 2)
+        self.assertEqual(result["restored"]["score"], 2)
+
+    def test_restored_accounts_need_a_password_reset(self):
+        self.round_trip()
+
+        head = User.objects.get(username="head")
+        self.assertEqual(Course.objects.get().created_by, head)
+        self.assertTrue(head.is_staff)
+        self.assertFalse(head.is_superuser)
+        self.assertFalse(User.objects.get(username="student").is_staff)
+        for user in User.objects.all():
+            self.assertFalse(user.has_usable_password())
+            self.assertFalse(user.check_password(DEFAULT_PASSWORD))
+
+    def test_restoring_twice_changes_nothing(self):
+        archive = io.StringIO()
+        dump_archive(archive)
+        archive.seek(0)
+
+        result = restore_archive(iter_archive(archive))
+
+        self.assertEqual(self.midterms(), [(2, 40, "head"), (5, 90, "head")])
+        self.assertEqual(result["restored"]["user"], 0)
+        self.assertEqual(result["skipped"]["user"], 2)
+
+
+class ScoreSummarySignalTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="x",
+            role="student",
+        )
+        course = Course.objects.create(code="CS101", name="Course")
+        self.midterm = Assesment.objects.create(name="midterm", course=course)
+        self.final = Assesment.objects.create(name="final", course=course)
+
+    def summary(self, assessment):
+        summary = AssessmentScoreSummary.objects.get(assesment=assessment)
+        return summary.score_sum, summary.score_count
+
+    def test_single_saves_update_the_summary(self):
+        score = StudentAssessmentScore.objects.create(
+            student=self.student, assesment=self.midterm, score=40
+        )
+        self.assertEqual(self.summary(self.midterm), (40, 1))
+
+        score.score = 70
+        score.save()
+        self.assertEqual(self.summary(self.midterm), (70, 1))
+
+        score.assesment = self.final
+        score.save()
+        self.assertEqual(self.summary(self.midterm), (0, 0))
+        self.assertEqual(self.summary(self.final), (70, 1))
+
+        score.delete()
+        self.assertEqual(self.summary(self.final), (0, 0))
+
+
+class GradeImportTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(code="CS101", name="Course")
+        self.midterm = Assesment.objects.create(name="midterm", course=self.course)
+        User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="x",
+            role="student",
+        )
+
+    def test_short_rows_and_non_finite_scores(self):
+        rows = [
+            (str(self.midterm.id), "username"),
+            ("50",),
+            ("nan", "student"),
+            ("70", "student"),
+        ]
+
+        result = import_course_grades(self.course, rows)
+
+        self.assertEqual(result["saved"], 1)
+        self.assertEqual(
+            result["errors"],
+            ["row 2: missing username", "row 3: student: invalid score 'nan'"],
+        )
+        self.assertEqual(self.summary(), (70, 1))
+
+    def summary(self):
+        summary = AssessmentScoreSummary.objects.get(assesment=self.midterm)
+        return summary.score_sum, summary.score_count
+
+
+class CurriculumImportTests(TestCase):
+    def course(self, code, lo_code, po_code="PO1", assessed_lo=None):
+        return {
+            "course_code": code,
+            "course_name": f"Course {code}",
+            "learning_outcomes": [
+                {
+                    "code": lo_code,
+                    "description": "Outcome",
+                    "program_outcomes": [{"code": po_code, "weight": 1}],
+                }
+            ],
+            "assessments": [
+                {
+                    "assessment_type": "final",
+                    "learning_outcomes": [
+                        {"code": assessed_lo or lo_code, "weight": 1}
+                    ],
+                }
+            ],
+        }
+
+    def test_courses_are_checked_before_anything_is_written(self):
+        ProgramOutcome.objects.create(code="PO1", description="")
+        Course.objects.create(code="TAKEN", name="Taken")
+        courses = [
+            self.course("CS101", "LO1"),
+            self.course("CS102", "LO12345678X"),
+            self.course("TAKEN", "LO3"),
+            self.course("CS104", "LO1"),
+            self.course("CS105", "LO5", po_code="PO9"),
+            self.course("CS106", "LO6", assessed_lo="LO9"),
+        ]
+
+        result = import_curriculum(enumerate(courses, start=1))
+
+        self.assertEqual((result["created"], result["failed"]), (0, 6))
+        self.assertEqual(
+            [(course["row"], course["errors"]) for course in result["courses"]],
+            [
+                (1, {"learning_outcomes": ["LO1: code appears more than once."]}),
+                (
+                    2,
+                    {
+                        "learning_outcomes": [
+                            {
+                                "code": [
+                                    "Ensure this field has no more than 10 "
+                                    "characters."
+                                ]
+                            }
+                        ]
+                    },
+                ),
+                (3, {"course_code": ["Course code already exists."]}),
+                (4, {"learning_outcomes": ["LO1: code appears more than once."]}),
+                (5, {"learning_outcomes": ["LO5: unknown program outcome PO9."]}),
+                (6, {"assessments": ["final: unknown learning outcome LO9."]}),
+            ],
+        )
+        self.assertEqual(Course.objects.count(), 1)
+
+    def test_valid_courses_are_created(self):
+        ProgramOutcome.objects.create(code="PO1", description="")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_curriculum(
+                enumerate([self.course("CS101", "LO1"), self.course("CS102", "LO2")])
+            )
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(
+            list(
+                AssessmentLearningOutcome.objects.order_by("id").values_list(
+                    "assesment__course__code", "learning_outcome__code"
+                )
+            ),
+            [("CS101", "LO1"), ("CS102", "LO2")],
+        )
+        self.assertEqual(
+            LearningOutcome.objects.filter(attainment__isnull=False).count(), 2
+        )
+
+
+class UserImportTests(TestCase):
+    def test_rows_are_checked_like_the_create_serializers(self):
+        User.objects.create_user(
+            username="taken", email="taken@example.com", password="x", role="student"
+        )
+        rows = [
+            {"username": "teacher", "email": "teacher@example.com"},
+            {"username": "", "email": "blank@example.com"},
+            {"username": "bad", "email": "not an email"},
+            {"username": "teacher", "email": "again@example.com"},
+            {"username": "taken", "email": "new@example.com"},
+            {"username": "new", "email": "taken@example.com"},
+        ]
+
+        result = import_users(rows, "teacher")
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(
+            [(error["row"], error["error"]) for error in result["errors"]],
+            [
+                (3, "Missing username."),
+                (4, "Invalid email."),
+                (5, "Duplicate username in file."),
+                (6, "Username already taken."),
+                (7, "Email already taken."),
+            ],
+        )
+        self.assertTrue(User.objects.get(username="teacher").is_staff)
+
+
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(code="CS101", name="Course")
+
+    def test_waiting_callers_use_the_lock_holders_value(self):
+        cache.add("report:lock", "other", timeout=30)
+        compute = mock.Mock(return_value="computed")
+
+        # The holder stores its value while this caller waits for the lock.
+        with mock.patch(
+            "core.report_cache.time.sleep",
+            side_effect=lambda _: cache.set("report", "stored"),
+        ):
+            value = get_or_compute("report", compute)
+
+        self.assertEqual(value, "stored")
+        compute.assert_not_called()
+
+    def test_an_overrun_does_not_release_the_next_holders_lock(self):
+        def compute():
+            # The lock expires mid-computation and another caller takes it.
+            cache.delete("report:lock")
+            cache.add("report:lock", "other", timeout=30)
+            return "computed"
+
+        self.assertEqual(get_or_compute("report", compute), "computed")
+        self.assertEqual(cache.get("report:lock"), "other")
+
+    def test_bumps_invalidate_cached_reports(self):
+        with mock.patch(
+            "core.report_cache.calculate_course_report", return_value={}
+        ) as course_report, mock.patch(
+            "core.report_cache.calculate_department_report", return_value={}
+        ) as department_report:
+            get_course_report(self.course)
+            get_department_report()
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_course_versions([self.course.id + 1])
+            get_course_report(self.course)
+            self.assertEqual(course_report.call_count, 1)
+            self.assertEqual(department_report.call_count, 1)
+
+            get_department_report()
+            self.assertEqual(department_report.call_count, 2)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_course_versions([self.course.id])
+            get_course_report(self.course)
+            get_department_report()
+            self.assertEqual(course_report.call_count, 2)
+            self.assertEqual(department_report.call_count, 3)
@@ -2,3 +2,32 @@ export function capitalize(str: string) {
     if (!str) return '';
     return str.charAt(0).toUpperCase() + str.slice(1);
 }
+
+export type Page<T> = {
+    items: T[];
+    next: string | null;
+    previous: string | null;
+};
+
+// Fetches one page of a cursor-paginated list endpoint. `url` is either the
+// first page or a `next`/`previous` link returned with an earlier page.
+export async function fetchPage<T>(
+    url: string,
+    key: string,
+    accessToken: string,
+): Promise<Page<T>> {
+    const res = await fetch(url, {
+        headers: { Authorization: `Bearer ${accessToken}` },
+    });
+    if (!res.ok) throw new Error(`Failed to fetch ${url}`);
+    const data = await res.json();
+    return { items: data[key], next: data.next, previous: data.previous };
+}
+
+// Adds a `search` query parameter to a list URL unless the term is empty.
+export function withSearch(url: string, search: string) {
+    const term = search.trim();
+    if (!term) return url;
+    const separator = url.includes('?') ? '&' : '?';
+    return `${url}${separator}search=${encodeURIComponent(term)}`;
+}